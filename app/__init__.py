@@ -1,6 +1,6 @@
 from flask import Flask
 from flask_httpauth import HTTPTokenAuth
-from app.config import API_KEY
+from app.config import API_TOKENS
 
 auth = HTTPTokenAuth(scheme="Bearer")
 
@@ -8,31 +8,45 @@ auth = HTTPTokenAuth(scheme="Bearer")
 @auth.verify_token
 def verify_token(token):
     """
-    Verifies the provided token against the API key.
+    Verifies the provided token and looks up the namespaces it may access.
+
+    API_KEY may access every namespace, the tokens in API_TOKENS only the
+    namespaces listed for them.
 
     Args:
         token (str): The token to be verified.
 
     Returns:
-        bool: True if the token matches the API key, False otherwise.
+        set: The namespaces the token may access, containing "*" for all
+             namespaces, or None if the token is unknown.
     """
-    if token == API_KEY:
-        return True
-    return False
+    return API_TOKENS.get(token)
 
 
-def create_app():
+def create_app(start_services=True):
     """
     Creates and configures the Flask application.
 
-    This function sets up the Flask application, registers the routes blueprint,
-    and returns the configured app instance.
+    This function sets up the Flask application, registers the routes blueprint
+    and the opt-in profiling hooks, and returns the configured app instance.
+
+    Args:
+        start_services (bool): Also start the run engine (replaying its journal
+            to recover interrupted runs) and the scheduler of cron-triggered
+            pipelines. Only the process serving requests should start them.
 
     Returns:
         Flask: The configured Flask application instance.
     """
     app = Flask(__name__)
+    from . import profiling
+    from .engine import engine
     from .routes import bp as routes_bp
+    from .scheduler import scheduler
 
     app.register_blueprint(routes_bp)
+    profiling.init_app(app)
+    if start_services:
+        engine.start()
+        scheduler.start()
     return app
@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from .config import STAGE_CACHE_DIR, STAGE_CACHE_MAX_BYTES, STAGE_WORKSPACE_DIR
+
+
+def is_workspace_pattern(pattern):
+    """
+    Checks that an input glob stays inside the workspace.
+
+    Args:
+        pattern (str): The glob pattern of a RUN stage input.
+
+    Returns:
+        bool: False if the pattern is absolute or contains a '..' component.
+    """
+    parts = pattern.replace("\\", "/").split("/")
+    return not os.path.isabs(pattern) and parts[0] != "" and ".." not in parts
+
+
+class StageCache:
+    """
+    On-disk cache of RUN stage results keyed on the command and its inputs.
+
+    Every entry is a JSON file named after its key. Input globs are resolved
+    under the workspace directory and files outside it are ignored.
+
+    The entries and their sizes are indexed in memory in least-recently-used
+    order, so eviction does not have to scan the directory on every put. The
+    index is built from the files' modification times on first use, and hits
+    bump the modification time so the order survives a restart.
+    """
+
+    def __init__(self, directory, max_bytes, workspace):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workspace = workspace
+        self._lock = threading.Lock()
+        self._index = None
+        self._total = 0
+
+    def key(self, stage, env=None):
+        """
+        Computes the cache key of a RUN stage.
+
+        The key covers the command, its environment, the input globs and the
+        path and contents of every file the globs currently match inside the
+        workspace.
+
+        Args:
+            stage (dict): The RUN stage configuration.
+            env (dict): The environment variables the command runs with.
+
+        Returns:
+            str: The hex digest identifying the stage's inputs.
+        """
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps(
+                [stage["command"], stage.get("inputs", []), env or {}], sort_keys=True
+            ).encode()
+        )
+        workspace = os.path.realpath(self.workspace)
+        for pattern in stage.get("inputs", []):
+            if not is_workspace_pattern(pattern):
+                continue
+            matches = glob.glob(
+                os.path.join(glob.escape(workspace), pattern), recursive=True
+            )
+            for match in sorted(matches):
+                path = os.path.relpath(match, workspace)
+                full_path = os.path.realpath(match)
+                # Symlinks may still point outside the workspace.
+                if not full_path.startswith(workspace + os.sep) or not os.path.isfile(
+                    full_path
+                ):
+                    continue
+                digest.update(b"\0" + path.encode() + b"\0")
+                with open(full_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(65536), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a stored stage result and marks it as recently used.
+
+        Args:
+            key (str): The cache key of the stage.
+
+        Returns:
+            dict: The stored result with 'exit_status' and 'log', or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a stage result and evicts old entries if the cache is over its cap.
+
+        Args:
+            key (str): The cache key of the stage.
+            result (dict): The result with 'exit_status' and 'log'.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        with self._lock:
+            index = self._load_index()
+            self._total += size - index.pop(key, 0)
+            index[key] = size
+            while index and self._total > self.max_bytes:
+                old_key, old_size = index.popitem(last=False)
+                self._remove(self._path(old_key))
+                self._total -= old_size
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock:
+            for entry in self._entries():
+                self._remove(entry.path)
+            self._index = OrderedDict()
+            self._total = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _entries(self):
+        try:
+            return [
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".json")
+            ]
+        except FileNotFoundError:
+            return []
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _load_index(self):
+        if self._index is None:
+            entries = []
+            for entry in self._entries():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append(
+                    (stat.st_mtime, entry.name[: -len(".json")], stat.st_size)
+                )
+            entries.sort()
+            self._index = OrderedDict((key, size) for _, key, size in entries)
+            self._total = sum(self._index.values())
+        return self._index
+
+
+stage_cache = StageCache(STAGE_CACHE_DIR, STAGE_CACHE_MAX_BYTES, STAGE_WORKSPACE_DIR)
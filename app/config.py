@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,3 +10,74 @@ if not API_KEY:
     raise ValueError(
         "No API_KEY set for Flask application. Please set API_KEY environment variable."
     )
+
+STAGE_CACHE_DIR = os.getenv(
+    "STAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cicd-stage-cache")
+)
+STAGE_CACHE_MAX_BYTES = int(os.getenv("STAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# RUN stage 'inputs' globs are resolved relative to this directory.
+STAGE_WORKSPACE_DIR = os.path.abspath(os.getenv("STAGE_WORKSPACE_DIR", os.getcwd()))
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true")
+PROFILE_ENDPOINTS = {
+    endpoint for endpoint in os.getenv("PROFILE_ENDPOINTS", "").split(",") if endpoint
+}
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "cicd-profiles")
+)
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 100))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 0))
+SLOW_REQUEST_SAMPLING = os.getenv("SLOW_REQUEST_SAMPLING", "false").lower() in (
+    "1",
+    "true",
+)
+ADMIN_API_KEYS = {key for key in os.getenv("ADMIN_API_KEYS", "").split(",") if key}
+
+# Unlike the caches, the run journal must survive reboots and temp dir cleanup.
+RUN_JOURNAL_PATH = os.getenv(
+    "RUN_JOURNAL_PATH",
+    os.path.join(
+        os.getenv("XDG_DATA_HOME")
+        or os.path.join(os.path.expanduser("~"), ".local", "share"),
+        "cicd-pipeline-api",
+        "run-journal.log",
+    ),
+)
+RUN_JOURNAL_MAX_BYTES = int(os.getenv("RUN_JOURNAL_MAX_BYTES", 16 * 1024 * 1024))
+RUN_JOURNAL_FLUSH_MS = float(os.getenv("RUN_JOURNAL_FLUSH_MS", 50))
+RUN_WORKERS = int(os.getenv("RUN_WORKERS", 2))
+# Finished runs kept for status polling, older ones are forgotten.
+RUN_HISTORY_MAX = int(os.getenv("RUN_HISTORY_MAX", 1000))
+RUN_RESUME = os.getenv("RUN_RESUME", "true").lower() in ("1", "true")
+SHUTDOWN_DEADLINE_S = float(os.getenv("SHUTDOWN_DEADLINE_S", 30))
+# The debug reloader handles SIGTERM itself, so runs are only drained without it.
+DEBUG_RELOADER = os.getenv("DEBUG_RELOADER", "false").lower() in ("1", "true")
+
+# Extra bearer tokens and the namespaces they may access, for example
+# "team-a-token:team-a;ci-token:team-a,team-b". API_KEY may access every namespace.
+API_TOKENS = {API_KEY: {"*"}}
+for entry in os.getenv("API_TOKENS", "").split(";"):
+    token, _, allowed = entry.partition(":")
+    if token and allowed:
+        API_TOKENS[token] = {namespace for namespace in allowed.split(",") if namespace}
+
+NAMESPACE_SHARDS = int(os.getenv("NAMESPACE_SHARDS", 16))
+NAMESPACE_MAX_PIPELINES = int(os.getenv("NAMESPACE_MAX_PIPELINES", 10000))
+NAMESPACE_MAX_CONCURRENT_RUNS = int(os.getenv("NAMESPACE_MAX_CONCURRENT_RUNS", 16))
+NAMESPACE_RATE_LIMIT = float(os.getenv("NAMESPACE_RATE_LIMIT", 0))
+NAMESPACE_RATE_BURST = int(os.getenv("NAMESPACE_RATE_BURST", 100))
+# Per-namespace overrides of the quotas above, for example
+# '{"team-a": {"max_pipelines": 50, "rate_limit": 10}}'.
+NAMESPACE_QUOTAS = json.loads(os.getenv("NAMESPACE_QUOTAS", "{}"))
+
+SECRETS_PROVIDER = os.getenv("SECRETS_PROVIDER", "file")
+SECRETS_FILE = os.getenv("SECRETS_FILE", "secrets.json")
+SECRETS_KEY = os.getenv("SECRETS_KEY")
+SECRETS_CACHE_TTL_S = float(os.getenv("SECRETS_CACHE_TTL_S", 60))
+
+# Missed schedule ticks to run when the scheduler falls more than
+# SCHEDULER_MISFIRE_GRACE_S behind, 0 skips them.
+SCHEDULER_CATCHUP = int(os.getenv("SCHEDULER_CATCHUP", 1))
+SCHEDULER_MISFIRE_GRACE_S = float(os.getenv("SCHEDULER_MISFIRE_GRACE_S", 60))
+SCHEDULER_JITTER_S = float(os.getenv("SCHEDULER_JITTER_S", 0))
@@ -0,0 +1,447 @@
+import contextlib
+import copy
+import itertools
+import os
+import queue
+import signal
+import threading
+import time
+from .cache import stage_cache
+from .config import (
+    RUN_JOURNAL_FLUSH_MS,
+    RUN_JOURNAL_MAX_BYTES,
+    RUN_JOURNAL_PATH,
+    RUN_RESUME,
+    RUN_WORKERS,
+    SHUTDOWN_DEADLINE_S,
+)
+from .journal import RunJournal
+from .metrics import metrics
+from .models import DEFAULT_NAMESPACE, CommandType, RunStatus, get_namespace, runs
+from .profiling import record_stage_timing
+from .secret_store import SecretNotFound, redact, secret_cache
+
+
+class EngineUnavailable(Exception):
+    """Raised when a run is requested while the engine is shutting down."""
+
+
+def _log(line, secrets):
+    print(redact(line, secrets))
+
+
+def _run_command(stage, env):
+    """
+    Run the command of a RUN stage.
+
+    Args:
+        stage (dict): The RUN stage configuration.
+        env (dict): The environment variables to run the command with.
+
+    Returns:
+        dict: The exit status and log lines of the command.
+    """
+    return {"exit_status": 0, "log": [f"Running command: {stage['command']}"]}
+
+
+def _run_stage(stage, env, secrets):
+    """
+    Run a RUN stage, replaying its cached result if its inputs are unchanged.
+
+    Stages opt in to caching with 'cache': true. The cache key covers the
+    command, its environment and the contents of the files matched by the
+    stage's 'inputs' globs. Logs are redacted before they are cached.
+
+    Args:
+        stage (dict): The RUN stage configuration.
+        env (dict): The environment variables to run the command with.
+        secrets (list): The secret values to redact from the log.
+
+    Returns:
+        dict: The stage type, exit status and whether the result came from the cache.
+    """
+    cached = False
+    if stage.get("cache"):
+        key = stage_cache.key(stage, env)
+        result = stage_cache.get(key)
+        if result is None:
+            metrics.incr("stage_cache_misses")
+            result = _run_command(stage, env)
+            result["log"] = redact(result["log"], secrets)
+            stage_cache.put(key, result)
+        else:
+            metrics.incr("stage_cache_hits")
+            cached = True
+            _log(f"Replaying cached result for command: {stage['command']}", secrets)
+    else:
+        result = _run_command(stage, env)
+    for line in result["log"]:
+        _log(line, secrets)
+    return {
+        "type": CommandType.RUN,
+        "exit_status": result["exit_status"],
+        "cached": cached,
+    }
+
+
+def execute_stage(stage, env=None, secrets=()):
+    """
+    Execute a single stage of a pipeline.
+
+    Args:
+        stage (dict): The validated stage configuration.
+        env (dict): The environment variables of the stage, including its secrets.
+        secrets (list): The secret values to redact from the stage's output.
+
+    Returns:
+        dict: The stage type and exit status.
+    """
+    if stage["type"] == CommandType.RUN:
+        return _run_stage(stage, env or {}, secrets)
+    if stage["type"] == CommandType.BUILD:
+        _log(f"Building Docker image from: {stage['dockerfile']}", secrets)
+        # Simulate Docker build and push to ECR
+        _log(
+            f"Successfully built and pushed Docker image from {stage['dockerfile']} to ECR",
+            secrets,
+        )
+        return {"type": CommandType.BUILD, "exit_status": 0}
+    _log(f"Deploying Kubernetes manifest: {stage['manifest']}", secrets)
+    # Simulate kubectl apply
+    _log(
+        f"Successfully applied Kubernetes manifest {stage['manifest']} to the cluster",
+        secrets,
+    )
+    return {"type": CommandType.DEPLOY, "exit_status": 0}
+
+
+class RunEngine:
+    """
+    Executes pipeline runs and journals their progress.
+
+    Every run is recorded in a write-ahead journal: one event when it starts,
+    one before and after each stage and one when it completes. Runs triggered
+    through the API execute in the request thread, runs submitted to the engine
+    execute on a pool of worker threads.
+
+    On start the journal is replayed. Runs that stopped between stages are
+    resumed from the stage after the last completed one. Runs that stopped in
+    the middle of a BUILD or DEPLOY stage cannot be resumed safely and are
+    marked as failed, while an interrupted RUN stage is simply run again.
+    """
+
+    # Stages with side effects outside the engine must be durably journaled
+    # before they start. Starting an interrupted RUN stage again is harmless,
+    # so its start is left to the journal's periodic flush.
+    DURABLE_STAGES = {CommandType.BUILD, CommandType.DEPLOY}
+
+    def __init__(
+        self, journal_path, journal_max_bytes, journal_flush_interval, workers, resume
+    ):
+        self.journal = RunJournal(
+            journal_path, journal_max_bytes, journal_flush_interval
+        )
+        self.workers = workers
+        self.resume = resume
+        self._run_ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._accepting = True
+        self._started = False
+
+    def start(self):
+        """
+        Replays the journal, resumes or fails interrupted runs and starts the workers.
+
+        Calling start() again has no effect.
+
+        Raises:
+            JournalInUse: If another process has the run journal open.
+        """
+        with self._idle:
+            if self._started:
+                return
+            self._started = True
+        try:
+            open_runs = self.journal.open()
+        except Exception:
+            with self._idle:
+                self._started = False
+            raise
+        self._recover(open_runs)
+        self.journal.compact(force=True)
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"run-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def trigger(self, namespace, pipeline_id, stages):
+        """
+        Runs a pipeline in the calling thread.
+
+        Args:
+            namespace (Namespace): The namespace of the pipeline.
+            pipeline_id (int): The ID of the pipeline being run.
+            stages (list): The validated stage configurations.
+
+        Returns:
+            dict: The finished run.
+
+        Raises:
+            QuotaExceeded: If the namespace is running too many runs already.
+            EngineUnavailable: If the engine is shutting down.
+        """
+        job = self._create(namespace, pipeline_id, stages)
+        try:
+            self._execute(job)
+        finally:
+            self._finish(job)
+        return job["run"]
+
+    def submit(self, namespace, pipeline_id, stages):
+        """
+        Queues a pipeline run for the worker threads.
+
+        Args:
+            namespace (Namespace): The namespace of the pipeline.
+            pipeline_id (int): The ID of the pipeline being run.
+            stages (list): The validated stage configurations.
+
+        Returns:
+            dict: The queued run.
+
+        Raises:
+            QuotaExceeded: If the namespace is running too many runs already.
+            EngineUnavailable: If the engine is shutting down.
+        """
+        job = self._create(namespace, pipeline_id, stages)
+        self._queue.put(job)
+        return job["run"]
+
+    def shutdown(self, deadline):
+        """
+        Stops accepting runs and waits for queued and in-flight runs to finish.
+
+        Runs still queued when the deadline passes stay in the journal and are
+        resumed on the next start.
+
+        Args:
+            deadline (float): The maximum number of seconds to wait.
+
+        Returns:
+            bool: True if all runs finished before the deadline, False otherwise.
+        """
+        with self._idle:
+            self._accepting = False
+            drained = self._idle.wait_for(lambda: self._in_flight == 0, deadline)
+        for _ in self._threads:
+            self._queue.put(None)
+        if drained and self._started:
+            self.journal.close()
+        return drained
+
+    def install_signal_handler(self, deadline=SHUTDOWN_DEADLINE_S):
+        """
+        Drains the engine when the process receives SIGTERM, then stops the server.
+
+        The handler stops accepting runs and returns right away, so the server
+        keeps answering requests, and triggers get a 503, while runs drain in a
+        background thread. Once they finished or the deadline passed, SIGINT is
+        sent to the process so the server's accept loop exits. A second SIGTERM
+        kills the process.
+
+        Must be called from the main thread.
+
+        Args:
+            deadline (float): The maximum number of seconds to wait for runs.
+        """
+
+        def drain():
+            if not self.shutdown(deadline):
+                print(f"Shutdown deadline of {deadline}s passed with runs in flight")
+            os.kill(os.getpid(), signal.SIGINT)
+
+        def handle_sigterm(signum, frame):
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            with self._idle:
+                self._accepting = False
+            threading.Thread(target=drain, name="engine-drain", daemon=True).start()
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def _create(self, namespace, pipeline_id, stages):
+        with self._idle:
+            if not self._accepting:
+                raise EngineUnavailable("Run engine is shutting down")
+            namespace.start_run()
+            self._in_flight += 1
+        run = {
+            "id": next(self._run_ids),
+            "namespace": namespace.name,
+            "pipeline_id": pipeline_id,
+            "status": RunStatus.QUEUED,
+            "stages": [],
+        }
+        stages = copy.deepcopy(stages)
+        job = {"run": run, "namespace": namespace, "stages": stages, "start": 0}
+        try:
+            seq = self.journal.append(
+                {
+                    "event": "run_started",
+                    "run_id": run["id"],
+                    "namespace": namespace.name,
+                    "pipeline_id": pipeline_id,
+                    "stages": stages,
+                }
+            )
+            # A run is only accepted once a restart can find it.
+            self.journal.sync(seq)
+        except Exception:
+            # The start event may still reach the disk later; make sure a
+            # restart does not resume a run the caller was told had failed.
+            with contextlib.suppress(Exception):
+                self.journal.append(
+                    {
+                        "event": "run_completed",
+                        "run_id": run["id"],
+                        "status": RunStatus.FAILED,
+                    }
+                )
+            self._finish(job)
+            raise
+        runs.add(run)
+        return job
+
+    def _finish(self, job):
+        job["namespace"].finish_run()
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def _execute(self, job):
+        run = job["run"]
+        run["status"] = RunStatus.RUNNING
+        secrets = {}
+        try:
+            # Secrets are resolved once per run and never written to the journal.
+            secrets = secret_cache.resolve(
+                job["namespace"].name,
+                [name for stage in job["stages"] for name in stage.get("secrets", [])],
+            )
+            for index in range(job["start"], len(job["stages"])):
+                stage = job["stages"][index]
+                env = dict(stage.get("env", {}))
+                env.update({name: secrets[name] for name in stage.get("secrets", [])})
+                seq = self.journal.append(
+                    {"event": "stage_started", "run_id": run["id"], "index": index}
+                )
+                if stage["type"] in self.DURABLE_STAGES:
+                    self.journal.sync(seq)
+                started = time.perf_counter()
+                result = execute_stage(stage, env, list(secrets.values()))
+                record_stage_timing(stage, started)
+                run["stages"].append(result)
+                seq = self.journal.append(
+                    {
+                        "event": "stage_completed",
+                        "run_id": run["id"],
+                        "index": index,
+                        "result": result,
+                    }
+                )
+                self.journal.sync(seq)
+                if result["exit_status"] != 0:
+                    break
+        except SecretNotFound as e:
+            run["error"] = str(e)
+        except Exception as e:
+            run["error"] = redact(str(e), secrets.values())
+            raise
+        finally:
+            failed = "error" in run or any(
+                result["exit_status"] != 0 for result in run["stages"]
+            )
+            run["status"] = RunStatus.FAILED if failed else RunStatus.SUCCEEDED
+            self.journal.append(
+                {"event": "run_completed", "run_id": run["id"], "status": run["status"]}
+            )
+            self.journal.compact()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            except Exception as e:
+                print(f"Run {job['run']['id']} failed: {e}")
+            finally:
+                self._finish(job)
+
+    def _recover(self, open_runs):
+        for run_id, events in sorted(open_runs.items()):
+            if events[0]["event"] != "run_started":
+                continue
+            started = events[0]
+            results = [
+                event["result"]
+                for event in events
+                if event["event"] == "stage_completed"
+            ]
+            namespace = get_namespace(started.get("namespace", DEFAULT_NAMESPACE))
+            run = {
+                "id": run_id,
+                "namespace": namespace.name,
+                "pipeline_id": started["pipeline_id"],
+                "status": RunStatus.QUEUED,
+                "stages": results,
+            }
+            runs.add(run)
+
+            next_index = len(results)
+            interrupted = events[-1]["event"] == "stage_started" and (
+                started["stages"][events[-1]["index"]]["type"] in self.DURABLE_STAGES
+            )
+            failed = any(result["exit_status"] != 0 for result in results)
+            if interrupted or failed or not self.resume:
+                run["status"] = RunStatus.FAILED
+                if next_index < len(started["stages"]):
+                    run["error"] = f"Interrupted by a restart at stage {next_index}"
+                self.journal.append(
+                    {
+                        "event": "run_completed",
+                        "run_id": run_id,
+                        "status": run["status"],
+                    }
+                )
+                metrics.incr("runs_interrupted")
+            else:
+                run["resumed_from"] = next_index
+                namespace.start_run(force=True)
+                with self._idle:
+                    self._in_flight += 1
+                self._queue.put(
+                    {
+                        "run": run,
+                        "namespace": namespace,
+                        "stages": started["stages"],
+                        "start": next_index,
+                    }
+                )
+                metrics.incr("runs_resumed")
+        # Completed runs are compacted away, so the journal keeps the highest ID.
+        self._run_ids = itertools.count(self.journal.last_run_id + 1)
+
+
+engine = RunEngine(
+    RUN_JOURNAL_PATH,
+    RUN_JOURNAL_MAX_BYTES,
+    RUN_JOURNAL_FLUSH_MS / 1000,
+    RUN_WORKERS,
+    RUN_RESUME,
+)
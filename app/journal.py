@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock.
+    fcntl = None
+
+
+class JournalInUse(Exception):
+    """Raised when another process already has the run journal open."""
+
+
+class RunJournal:
+    """
+    Append-only write-ahead journal of run events on local disk.
+
+    Events are written as JSON lines. Durability is batched: sync() only calls
+    fsync if the event it waits for is not already on disk, so concurrent runs
+    waiting at the same time share a single fsync. Events nobody waits for are
+    made durable by a background thread every flush_interval seconds.
+
+    The journal keeps the events of every run that has not completed yet in
+    memory, along with the highest run ID it has seen, which is all that is
+    needed to rewrite a compacted journal. A compacted journal starts with a
+    'run_ids' marker event so run IDs are never reused after a restart.
+
+    Only one process may append to a journal: open() takes an exclusive lock
+    on a '.lock' file next to it, held until close().
+    """
+
+    def __init__(self, path, max_bytes, flush_interval):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._file = None
+        self._lock_file = None
+        self._written = 0
+        self._durable = 0
+        self._open_runs = {}
+        self.last_run_id = 0
+        self._closed = threading.Event()
+        self._closed.set()
+
+    def open(self):
+        """
+        Replays the journal from disk and opens it for appending.
+
+        A torn last line, left behind by a crash in the middle of a write, is ignored.
+
+        Returns:
+            dict: The events of every run without a 'run_completed' event, by run ID.
+
+        Raises:
+            JournalInUse: If another process has the journal open.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._lock_exclusive()
+        self._open_runs = {}
+        self.last_run_id = 0
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._track(event)
+        self._file = open(self.path, "a")
+        self._closed = threading.Event()
+        if self.flush_interval > 0:
+            threading.Thread(
+                target=self._flush,
+                args=(self._closed,),
+                name="journal-flusher",
+                daemon=True,
+            ).start()
+        return {run_id: list(events) for run_id, events in self._open_runs.items()}
+
+    def append(self, event):
+        """
+        Appends an event to the journal without waiting for it to reach the disk.
+
+        Args:
+            event (dict): The event, with at least 'event' and 'run_id' keys.
+
+        Returns:
+            int: The sequence number to pass to sync() to make the event durable.
+        """
+        with self._lock:
+            self._file.write(json.dumps(event) + "\n")
+            self._track(event)
+            self._written += 1
+            return self._written
+
+    def sync(self, seq):
+        """
+        Blocks until the event with the given sequence number is on disk.
+
+        Args:
+            seq (int): The sequence number returned by append().
+        """
+        with self._sync_lock:
+            if self._durable >= seq or self._file is None:
+                return
+            with self._lock:
+                self._file.flush()
+                target = self._written
+                fileno = self._file.fileno()
+            os.fsync(fileno)
+            self._durable = target
+
+    def compact(self, force=False):
+        """
+        Rewrites the journal with only the events of runs that have not completed.
+
+        Args:
+            force (bool): Compact even if the journal is smaller than max_bytes.
+        """
+        with self._sync_lock, self._lock:
+            self._file.flush()
+            if not force and self._file.tell() < self.max_bytes:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                marker = {"event": "run_ids", "last": self.last_run_id}
+                f.write(json.dumps(marker) + "\n")
+                for events in self._open_runs.values():
+                    for event in events:
+                        f.write(json.dumps(event) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+            self._durable = self._written
+
+    def close(self):
+        """Flushes and closes the journal."""
+        self._closed.set()
+        with self._sync_lock, self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _lock_exclusive(self):
+        # The lock lives in its own file because compaction replaces the journal.
+        lock_file = open(f"{self.path}.lock", "a")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise JournalInUse(
+                f"Run journal {self.path} is in use by another process. "
+                "Give each server its own RUN_JOURNAL_PATH."
+            )
+        return lock_file
+
+    def _flush(self, closed):
+        while not closed.wait(self.flush_interval):
+            self.sync(self._written)
+
+    def _track(self, event):
+        if event["event"] == "run_ids":
+            self.last_run_id = max(self.last_run_id, event["last"])
+            return
+        self.last_run_id = max(self.last_run_id, event["run_id"])
+        if event["event"] == "run_completed":
+            self._open_runs.pop(event["run_id"], None)
+        else:
+            self._open_runs.setdefault(event["run_id"], []).append(event)
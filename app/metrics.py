@@ -0,0 +1,35 @@
+import threading
+
+
+class Metrics:
+    """
+    Thread-safe named counters exposed through the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        """
+        Increments a counter, creating it if it does not exist yet.
+
+        Args:
+            name (str): The name of the counter.
+            value (int): The amount to add to the counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        Returns a copy of all counters.
+
+        Returns:
+            dict: A mapping of counter names to their current values.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
@@ -1,4 +1,23 @@
-pipelines = {}
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from .config import (
+    NAMESPACE_MAX_CONCURRENT_RUNS,
+    NAMESPACE_MAX_PIPELINES,
+    NAMESPACE_QUOTAS,
+    NAMESPACE_RATE_BURST,
+    NAMESPACE_RATE_LIMIT,
+    NAMESPACE_SHARDS,
+    RUN_HISTORY_MAX,
+)
+
+DEFAULT_NAMESPACE = "default"
+NAMESPACE_PATTERN = re.compile(r"^[a-z0-9]([a-z0-9_-]{0,62})$")
+
+namespaces = {}
+namespaces_lock = threading.Lock()
 
 
 class CommandType:
@@ -18,3 +37,283 @@ class CommandType:
             bool: True if the command type is valid, False otherwise.
         """
         return command_type in {cls.RUN, cls.BUILD, cls.DEPLOY}
+
+
+class RunStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    @classmethod
+    def is_terminal(cls, status):
+        """
+        Checks if a run with the provided status has finished.
+
+        Args:
+            status (str): The run status to be checked.
+
+        Returns:
+            bool: True if the run has succeeded or failed, False otherwise.
+        """
+        return status in {cls.SUCCEEDED, cls.FAILED}
+
+
+class RunStore:
+    """
+    Runs by ID, keeping at most max_finished of the most recent finished runs.
+
+    Queued and running runs are never evicted, so their status can always be
+    polled until they finish.
+    """
+
+    def __init__(self, max_finished):
+        self.max_finished = max_finished
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, run):
+        """
+        Stores a run, evicting the oldest finished runs if the store is full.
+
+        Args:
+            run (dict): The run, with its 'id' and 'status'.
+        """
+        with self._lock:
+            self._runs[run["id"]] = run
+            excess = len(self._runs) - self.max_finished
+            if excess <= 0:
+                return
+            # Runs finish roughly in the order they were added, so the oldest
+            # finished runs are near the front.
+            evicted = []
+            for run_id, stored in self._runs.items():
+                if len(evicted) == excess:
+                    break
+                if RunStatus.is_terminal(stored["status"]):
+                    evicted.append(run_id)
+            for run_id in evicted:
+                del self._runs[run_id]
+
+    def get(self, run_id):
+        """
+        Looks up a run.
+
+        Args:
+            run_id (int): The ID of the run.
+
+        Returns:
+            dict: The run, or None if it does not exist or has been evicted.
+        """
+        return self._runs.get(run_id)
+
+
+runs = RunStore(RUN_HISTORY_MAX)
+
+
+class QuotaExceeded(Exception):
+    """Raised when a namespace is over one of its quotas."""
+
+
+class PipelineStore:
+    """
+    Pipelines of a single namespace, spread over shards by ID.
+
+    Each shard has its own lock, so writes to different pipelines rarely wait
+    on each other. Only allocating an ID takes a store-wide lock.
+    """
+
+    def __init__(self, shards):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._ids = itertools.count(1)
+        self._count = 0
+        self._count_lock = threading.Lock()
+
+    def add(self, pipeline, limit):
+        """
+        Stores a new pipeline.
+
+        Args:
+            pipeline (dict): The pipeline configuration.
+            limit (int): The maximum number of pipelines the store may hold.
+
+        Returns:
+            int: The ID of the new pipeline.
+
+        Raises:
+            QuotaExceeded: If the store already holds limit pipelines.
+        """
+        with self._count_lock:
+            if self._count >= limit:
+                raise QuotaExceeded(f"Pipeline quota of {limit} exceeded")
+            self._count += 1
+            pipeline_id = next(self._ids)
+        pipelines, lock = self._shard(pipeline_id)
+        with lock:
+            pipelines[pipeline_id] = pipeline
+        return pipeline_id
+
+    def get(self, pipeline_id):
+        """
+        Looks up a pipeline.
+
+        Args:
+            pipeline_id (int): The ID of the pipeline.
+
+        Returns:
+            dict: The pipeline configuration, or None if it does not exist.
+        """
+        pipelines, _ = self._shard(pipeline_id)
+        return pipelines.get(pipeline_id)
+
+    def replace(self, pipeline_id, pipeline):
+        """
+        Replaces the configuration of an existing pipeline.
+
+        Args:
+            pipeline_id (int): The ID of the pipeline.
+            pipeline (dict): The new pipeline configuration.
+
+        Returns:
+            bool: True if the pipeline was replaced, False if it does not exist.
+        """
+        pipelines, lock = self._shard(pipeline_id)
+        with lock:
+            if pipeline_id not in pipelines:
+                return False
+            pipelines[pipeline_id] = pipeline
+            return True
+
+    def remove(self, pipeline_id):
+        """
+        Removes a pipeline.
+
+        Args:
+            pipeline_id (int): The ID of the pipeline.
+
+        Returns:
+            bool: True if the pipeline was removed, False if it does not exist.
+        """
+        pipelines, lock = self._shard(pipeline_id)
+        with lock:
+            if pipelines.pop(pipeline_id, None) is None:
+                return False
+        with self._count_lock:
+            self._count -= 1
+        return True
+
+    def ids(self):
+        """
+        Lists the IDs of all pipelines.
+
+        Returns:
+            list: The sorted pipeline IDs.
+        """
+        ids = []
+        for pipelines, lock in self._shards:
+            with lock:
+                ids.extend(pipelines)
+        return sorted(ids)
+
+    def _shard(self, pipeline_id):
+        return self._shards[pipeline_id % len(self._shards)]
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Takes a token from the bucket if one is available.
+
+        Returns:
+            bool: True if the request is within the rate limit, False otherwise.
+        """
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Namespace:
+    """
+    A tenant with its own pipeline store, quotas and rate limit.
+    """
+
+    def __init__(
+        self, name, max_pipelines, max_concurrent_runs, rate_limit, rate_burst
+    ):
+        self.name = name
+        self.pipelines = PipelineStore(NAMESPACE_SHARDS)
+        self.max_pipelines = max_pipelines
+        self.max_concurrent_runs = max_concurrent_runs
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        self._active_runs = 0
+        self._runs_lock = threading.Lock()
+
+    def start_run(self, force=False):
+        """
+        Counts a run against the namespace's concurrent run quota.
+
+        Args:
+            force (bool): Count the run even if the quota is already reached.
+
+        Raises:
+            QuotaExceeded: If the namespace is already running the maximum number of runs.
+        """
+        with self._runs_lock:
+            if not force and self._active_runs >= self.max_concurrent_runs:
+                raise QuotaExceeded(
+                    f"Concurrent run quota of {self.max_concurrent_runs} exceeded"
+                )
+            self._active_runs += 1
+
+    def finish_run(self):
+        """Releases a run counted by start_run()."""
+        with self._runs_lock:
+            self._active_runs -= 1
+
+
+def get_namespace(name):
+    """
+    Returns a namespace, creating it on first use.
+
+    Args:
+        name (str): The name of the namespace.
+
+    Returns:
+        Namespace: The namespace, or None if the name is invalid.
+    """
+    namespace = namespaces.get(name)
+    if namespace is not None:
+        return namespace
+    if not NAMESPACE_PATTERN.match(name):
+        return None
+    with namespaces_lock:
+        if name not in namespaces:
+            quotas = NAMESPACE_QUOTAS.get(name, {})
+            namespaces[name] = Namespace(
+                name,
+                quotas.get("max_pipelines", NAMESPACE_MAX_PIPELINES),
+                quotas.get("max_concurrent_runs", NAMESPACE_MAX_CONCURRENT_RUNS),
+                quotas.get("rate_limit", NAMESPACE_RATE_LIMIT),
+                quotas.get("rate_burst", NAMESPACE_RATE_BURST),
+            )
+        return namespaces[name]
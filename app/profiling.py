@@ -0,0 +1,218 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import g, has_request_context, request
+from . import config
+from .metrics import metrics
+
+
+class Sampler:
+    """
+    Sampling profiler shared by every profiled request.
+
+    A single background thread wakes up every interval and records the current
+    call stack of each registered request thread. Stacks are kept in collapsed
+    form ("file:function:line;..."), ready to feed into flame graph tools. The
+    thread sleeps without polling while no request is registered.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        """
+        Starts sampling a thread.
+
+        Args:
+            ident (int): The identifier of the thread to sample.
+        """
+        with self._lock:
+            self._active[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-sampler", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, ident):
+        """
+        Stops sampling a thread.
+
+        Args:
+            ident (int): The identifier of the sampled thread.
+
+        Returns:
+            Counter: The number of samples taken of each collapsed stack.
+        """
+        with self._lock:
+            return self._active.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                idents = list(self._active)
+            # Walk the stacks without holding the lock, so requests starting or
+            # stopping are never blocked behind a sample.
+            frames = sys._current_frames()
+            stacks = {
+                ident: _collapse(frames[ident]) for ident in idents if ident in frames
+            }
+            del frames
+            with self._lock:
+                for ident, stack in stacks.items():
+                    samples = self._active.get(ident)
+                    if samples is not None:
+                        samples[stack] += 1
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+sampler = Sampler(config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+
+def init_app(app):
+    """
+    Registers the profiling hooks on the application.
+
+    The hooks are only registered when profiling, slow-request capture or admin
+    keys are configured, so requests pay nothing while the mode is turned off.
+
+    Args:
+        app (Flask): The application to instrument.
+    """
+    if not (
+        config.PROFILING_ENABLED
+        or config.ADMIN_API_KEYS
+        or config.SLOW_REQUEST_THRESHOLD_MS > 0
+    ):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def record_stage_timing(stage, started):
+    """
+    Records how long a stage took for the slow-request trace of the current request.
+
+    Does nothing outside a request or while profiling hooks are not registered.
+
+    Args:
+        stage (dict): The stage configuration.
+        started (float): The time.perf_counter() value when the stage started.
+    """
+    if not has_request_context():
+        return
+    timings = g.get("stage_timings")
+    if timings is not None:
+        timings.append(
+            {
+                "type": stage["type"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+        )
+
+
+def _should_profile():
+    if request.headers.get("X-Profile") == "1":
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme == "Bearer" and token in config.ADMIN_API_KEYS:
+            return True
+    if not config.PROFILING_ENABLED:
+        return False
+    return not config.PROFILE_ENDPOINTS or request.endpoint in config.PROFILE_ENDPOINTS
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.stage_timings = []
+    g.profiled = _should_profile()
+    # Slow-request capture only records timings, unless sampling every request
+    # so slow ones come with their call stacks was asked for explicitly.
+    if g.profiled or (
+        config.SLOW_REQUEST_SAMPLING and config.SLOW_REQUEST_THRESHOLD_MS > 0
+    ):
+        g.sampled_thread = threading.get_ident()
+        sampler.start(g.sampled_thread)
+
+
+def _after_request(response):
+    samples = Counter()
+    if "sampled_thread" in g:
+        samples = sampler.stop(g.pop("sampled_thread"))
+    duration_ms = (time.perf_counter() - g.request_started) * 1000
+    slow = 0 < config.SLOW_REQUEST_THRESHOLD_MS <= duration_ms
+    if not (g.profiled or slow):
+        return response
+
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    _write_profile(
+        profile_id,
+        {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+            "profiled": g.profiled,
+            "slow": slow,
+            "stages": g.stage_timings,
+            "samples": dict(samples.most_common()),
+        },
+    )
+    if g.profiled:
+        metrics.incr("profiled_requests")
+        response.headers["X-Profile-Id"] = profile_id
+    if slow:
+        metrics.incr("slow_requests")
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when a request fails, make sure sampling stops.
+    if "sampled_thread" in g:
+        sampler.stop(g.pop("sampled_thread"))
+
+
+def _write_profile(profile_id, profile):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(config.PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump(profile, f)
+
+    entries = []
+    for entry in os.scandir(config.PROFILE_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        # Concurrent requests prune the same directory.
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            continue
+    entries.sort()
+    for _, path in entries[: max(0, len(entries) - config.PROFILE_MAX_FILES)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
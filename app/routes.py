@@ -1,3 +1,4 @@
+import functools
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 from .services import (
@@ -6,19 +7,50 @@ from .services import (
     update_pipeline,
     delete_pipeline,
     trigger_pipeline,
+    list_pipelines,
+    get_run,
 )
+from .metrics import metrics
+from .models import DEFAULT_NAMESPACE, get_namespace
 from . import auth
 
 bp = Blueprint("routes", __name__)
 
 
-@bp.route("/pipelines", methods=["POST"])
+def namespaced(view):
+    """
+    Resolves the namespace of a request before calling the view.
+
+    Routes without a namespace in their URL use the default namespace. Returns
+    a 403 error if the token may not access the namespace, a 404 error if the
+    namespace name is invalid and a 429 error if the namespace is over its rate limit.
+    """
+
+    @functools.wraps(view)
+    def wrapper(namespace, **kwargs):
+        allowed = auth.current_user()
+        if "*" not in allowed and namespace not in allowed:
+            return jsonify({"error": f"Access to namespace '{namespace}' denied"}), 403
+        resolved = get_namespace(namespace)
+        if resolved is None:
+            return jsonify({"error": f"Invalid namespace: {namespace}"}), 404
+        if not resolved.rate_limiter.allow():
+            return jsonify({"error": "Rate limit exceeded"}), 429
+        return view(resolved, **kwargs)
+
+    return wrapper
+
+
+@bp.route("/pipelines", methods=["POST"], defaults={"namespace": DEFAULT_NAMESPACE})
+@bp.route("/namespaces/<namespace>/pipelines", methods=["POST"])
 @auth.login_required
-def create():
+@namespaced
+def create(namespace):
     """
     Create a new pipeline.
 
     This endpoint expects a JSON payload with a 'stages' key containing a list of stages.
+    The pipeline is created in the namespace from the URL, or the default namespace.
     Returns a 400 error if the input is invalid or a 500 error if an unexpected error occurs.
     """
     try:
@@ -30,20 +62,45 @@ def create():
                 ),
                 400,
             )
-        return create_pipeline(data)
+        return create_pipeline(namespace, data)
     except BadRequest:
         return jsonify({"error": "Invalid input, expected JSON"}), 400
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
-@bp.route("/pipelines/<int:id>", methods=["GET"])
+@bp.route("/pipelines", methods=["GET"], defaults={"namespace": DEFAULT_NAMESPACE})
+@bp.route("/namespaces/<namespace>/pipelines", methods=["GET"])
 @auth.login_required
-def get(id):
+@namespaced
+def list_all(namespace):
+    """
+    List the IDs of all pipelines.
+
+    Args:
+        namespace (Namespace): The namespace to list the pipelines of.
+
+    Returns:
+        Response: A JSON response containing the pipeline IDs, or an error.
+    """
+    try:
+        return list_pipelines(namespace)
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@bp.route(
+    "/pipelines/<int:id>", methods=["GET"], defaults={"namespace": DEFAULT_NAMESPACE}
+)
+@bp.route("/namespaces/<namespace>/pipelines/<int:id>", methods=["GET"])
+@auth.login_required
+@namespaced
+def get(namespace, id):
     """
     Retrieve the configuration of an existing pipeline by ID.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         id (int): The ID of the pipeline to retrieve.
 
     Returns:
@@ -51,18 +108,23 @@ def get(id):
                   or an error message.
     """
     try:
-        return get_pipeline(id)
+        return get_pipeline(namespace, id)
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
-@bp.route("/pipelines/<int:id>", methods=["PUT"])
+@bp.route(
+    "/pipelines/<int:id>", methods=["PUT"], defaults={"namespace": DEFAULT_NAMESPACE}
+)
+@bp.route("/namespaces/<namespace>/pipelines/<int:id>", methods=["PUT"])
 @auth.login_required
-def update(id):
+@namespaced
+def update(namespace, id):
     """
     Update an existing pipeline configuration.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         id (int): The ID of the pipeline to update.
 
     Returns:
@@ -72,16 +134,21 @@ def update(id):
     data = request.json
     if not data:
         return jsonify({"error": "Invalid input, expected JSON"}), 400
-    return update_pipeline(id, data)
+    return update_pipeline(namespace, id, data)
 
 
-@bp.route("/pipelines/<int:id>", methods=["DELETE"])
+@bp.route(
+    "/pipelines/<int:id>", methods=["DELETE"], defaults={"namespace": DEFAULT_NAMESPACE}
+)
+@bp.route("/namespaces/<namespace>/pipelines/<int:id>", methods=["DELETE"])
 @auth.login_required
-def delete(id):
+@namespaced
+def delete(namespace, id):
     """
     Delete a pipeline configuration by ID.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         id (int): The ID of the pipeline to delete.
 
     Returns:
@@ -89,25 +156,77 @@ def delete(id):
                     or an error.
     """
     try:
-        return delete_pipeline(id)
+        return delete_pipeline(namespace, id)
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
-@bp.route("/pipelines/<int:id>/trigger", methods=["POST"])
+@bp.route(
+    "/pipelines/<int:id>/trigger",
+    methods=["POST"],
+    defaults={"namespace": DEFAULT_NAMESPACE},
+)
+@bp.route("/namespaces/<namespace>/pipelines/<int:id>/trigger", methods=["POST"])
 @auth.login_required
-def trigger(id):
+@namespaced
+def trigger(namespace, id):
     """
     Trigger the execution of a pipeline by ID.
 
+    With '?wait=false' the run is queued and the response returns right away
+    with status 202, instead of once the run has finished.
+
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         id (int): The ID of the pipeline to trigger.
 
     Returns:
         Response: A JSON response indicating the result of the trigger operation,
                   or an error.
     """
+    wait = request.args.get("wait", "true").lower() not in ("0", "false")
+    try:
+        return trigger_pipeline(namespace, id, wait)
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@bp.route(
+    "/pipelines/<int:id>/runs/<int:run_id>",
+    methods=["GET"],
+    defaults={"namespace": DEFAULT_NAMESPACE},
+)
+@bp.route(
+    "/namespaces/<namespace>/pipelines/<int:id>/runs/<int:run_id>", methods=["GET"]
+)
+@auth.login_required
+@namespaced
+def get_run_status(namespace, id, run_id):
+    """
+    Retrieve the status of a pipeline run.
+
+    Args:
+        namespace (Namespace): The namespace of the pipeline.
+        id (int): The ID of the pipeline the run belongs to.
+        run_id (int): The ID of the run to retrieve.
+
+    Returns:
+        Response: A JSON response containing the run, a 304 response if it is
+                  unchanged since the ETag sent in If-None-Match, or an error.
+    """
     try:
-        return trigger_pipeline(id)
+        return get_run(namespace, id, run_id)
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@bp.route("/metrics", methods=["GET"])
+@auth.login_required
+def get_metrics():
+    """
+    Retrieve the application counters, such as stage cache hits and misses.
+
+    Returns:
+        Response: A JSON response mapping counter names to their values.
+    """
+    return jsonify(metrics.snapshot())
@@ -0,0 +1,297 @@
+import bisect
+import heapq
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from .config import SCHEDULER_CATCHUP, SCHEDULER_JITTER_S, SCHEDULER_MISFIRE_GRACE_S
+from .engine import EngineUnavailable, engine
+from .metrics import metrics
+from .models import QuotaExceeded, get_namespace
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTH_NAMES = "jan feb mar apr may jun jul aug sep oct nov dec".split()
+DAY_NAMES = "sun mon tue wed thu fri sat".split()
+# A schedule that does not fire within this many years never fires (e.g. "0 0 30 2 *").
+MAX_YEARS = 5
+
+
+class CronExpression:
+    """
+    A standard five-field cron expression, evaluated in UTC.
+
+    Fields are minute, hour, day of month, month and day of week. Each field
+    accepts '*', numbers, ranges ('1-5'), steps ('*/15', '0-30/10') and
+    comma-separated lists of those. Months and days of week also accept
+    three-letter names. As in cron, when both day of month and day of week
+    are restricted, a day matching either of them matches.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError("expected 5 fields: minute hour day month weekday")
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12, MONTH_NAMES, 1)
+        weekdays = _parse_field(fields[4], 0, 7, DAY_NAMES, 0)
+        # 7 is an alias for Sunday.
+        self.weekdays = sorted({day % 7 for day in weekdays})
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        if self.next_after(datetime.now(timezone.utc)) is None:
+            raise ValueError(f"never fires within {MAX_YEARS} years")
+
+    def next_after(self, moment):
+        """
+        Computes the first time the expression fires after a moment.
+
+        Args:
+            moment (datetime): A timezone-aware datetime.
+
+        Returns:
+            datetime: The next firing time in UTC, or None if there is none
+                      within MAX_YEARS years.
+        """
+        t = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+        t += timedelta(minutes=1)
+        last_year = t.year + MAX_YEARS
+        while t.year <= last_year:
+            if t.month not in self.months:
+                t = _start_of_next_month(t)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            index = bisect.bisect_left(self.hours, t.hour)
+            if index == len(self.hours):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if self.hours[index] != t.hour:
+                t = t.replace(hour=self.hours[index], minute=0)
+            index = bisect.bisect_left(self.minutes, t.minute)
+            if index == len(self.minutes):
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=self.minutes[index])
+        return None
+
+    def _day_matches(self, t):
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+
+def _start_of_next_month(t):
+    if t.month == 12:
+        return t.replace(year=t.year + 1, month=1, day=1, hour=0, minute=0)
+    return t.replace(month=t.month + 1, day=1, hour=0, minute=0)
+
+
+def _parse_value(value, names, offset):
+    if names and value.lower() in names:
+        return names.index(value.lower()) + offset
+    if not value.isdigit():
+        raise ValueError(f"invalid value '{value}'")
+    return int(value)
+
+
+def _parse_field(field, low, high, names=None, offset=0):
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if step and (not step.isdigit() or int(step) == 0):
+            raise ValueError(f"invalid step '{step}'")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (_parse_value(v, names, offset) for v in part.split("-", 1))
+        else:
+            start = _parse_value(part, names, offset)
+            end = high if step else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"'{part}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, int(step or 1)))
+    return sorted(values)
+
+
+class Scheduler:
+    """
+    Triggers scheduled pipelines from a single timer thread.
+
+    Every schedule has one entry in a heap ordered by its next firing time,
+    so each tick costs O(log n) no matter how many pipelines are scheduled.
+    Rescheduling or removing a pipeline bumps its version; stale heap entries
+    are dropped when they reach the top.
+
+    If the scheduler falls more than misfire_grace seconds behind a schedule,
+    up to catchup of the missed ticks are run. Each firing time is delayed by
+    a random jitter of up to jitter seconds to spread out runs scheduled for
+    the same minute.
+    """
+
+    def __init__(self, engine, catchup, misfire_grace, jitter):
+        self.engine = engine
+        self.catchup = catchup
+        self.misfire_grace = misfire_grace
+        self.jitter = jitter
+        self._heap = []
+        self._schedules = {}
+        self._versions = itertools.count(1)
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def schedule(self, namespace, pipeline_id, cron):
+        """
+        Schedules a pipeline, replacing any previous schedule it had.
+
+        Args:
+            namespace (Namespace): The namespace of the pipeline.
+            pipeline_id (int): The ID of the pipeline.
+            cron (CronExpression): When to trigger the pipeline.
+        """
+        key = (namespace.name, pipeline_id)
+        with self._wakeup:
+            version = next(self._versions)
+            tick = cron.next_after(datetime.now(timezone.utc))
+            self._schedules[key] = (cron, version, self._push(tick, key, version))
+            # Drop stale entries once they outnumber the live ones, so pipelines
+            # that are rescheduled often do not grow the heap without bound.
+            if len(self._heap) > 2 * len(self._schedules) + 16:
+                self._heap = [
+                    item
+                    for item in self._heap
+                    if self._schedules.get(item[2], (None, None))[1] == item[3]
+                ]
+                heapq.heapify(self._heap)
+            self._wakeup.notify()
+
+    def unschedule(self, namespace, pipeline_id):
+        """
+        Removes the schedule of a pipeline, if it has one.
+
+        Args:
+            namespace (Namespace): The namespace of the pipeline.
+            pipeline_id (int): The ID of the pipeline.
+        """
+        with self._wakeup:
+            self._schedules.pop((namespace.name, pipeline_id), None)
+
+    def next_run(self, namespace, pipeline_id):
+        """
+        Returns when a pipeline is next due to be triggered.
+
+        Args:
+            namespace (Namespace): The namespace of the pipeline.
+            pipeline_id (int): The ID of the pipeline.
+
+        Returns:
+            float: The due time as a Unix timestamp, or None if it is not scheduled.
+        """
+        with self._wakeup:
+            entry = self._schedules.get((namespace.name, pipeline_id))
+            return entry[2] if entry else None
+
+    def start(self):
+        """Starts the timer thread. Calling start() again has no effect."""
+        with self._wakeup:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stops the timer thread."""
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+
+    def run_pending(self, now):
+        """
+        Triggers every schedule that is due.
+
+        Args:
+            now (float): The current time as a Unix timestamp.
+
+        Returns:
+            int: The number of runs submitted to the engine.
+        """
+        due = []
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                scheduled, _, key, version, tick = heapq.heappop(self._heap)
+                entry = self._schedules.get(key)
+                if entry is None or entry[1] != version:
+                    continue
+                cron = entry[0]
+                runs = 1
+                if now - scheduled > self.misfire_grace:
+                    missed = self._count_missed(cron, tick, now)
+                    metrics.incr("scheduled_ticks_missed", missed)
+                    runs = min(missed, self.catchup)
+                after = max(tick, datetime.fromtimestamp(now, timezone.utc))
+                next_due = self._push(cron.next_after(after), key, version)
+                self._schedules[key] = (cron, version, next_due)
+                due.extend([key] * runs)
+        return sum(self._submit(*key) for key in due)
+
+    def _count_missed(self, cron, tick, now):
+        missed = 0
+        while tick is not None and tick.timestamp() <= now:
+            missed += 1
+            tick = cron.next_after(tick)
+        return missed
+
+    def _push(self, tick, key, version):
+        if tick is None:
+            return None
+        due = tick.timestamp() + random.uniform(0, self.jitter)
+        heapq.heappush(self._heap, (due, next(self._versions), key, version, tick))
+        return due
+
+    def _submit(self, namespace_name, pipeline_id):
+        namespace = get_namespace(namespace_name)
+        pipeline = namespace.pipelines.get(pipeline_id)
+        if pipeline is None:
+            self.unschedule(namespace, pipeline_id)
+            return 0
+        try:
+            self.engine.submit(namespace, pipeline_id, pipeline["stages"])
+        except (QuotaExceeded, EngineUnavailable) as e:
+            metrics.incr("scheduled_runs_skipped")
+            print(f"Skipped scheduled run of pipeline {pipeline_id}: {e}")
+            return 0
+        metrics.incr("scheduled_runs")
+        return 1
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if self._stopped:
+                    return
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._wakeup.wait(timeout)
+                    continue
+            self.run_pending(time.time())
+
+
+scheduler = Scheduler(
+    engine, SCHEDULER_CATCHUP, SCHEDULER_MISFIRE_GRACE_S, SCHEDULER_JITTER_S
+)
@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from .config import SECRETS_CACHE_TTL_S, SECRETS_FILE, SECRETS_KEY, SECRETS_PROVIDER
+from .metrics import metrics
+
+REDACTED = "********"
+
+
+class SecretNotFound(Exception):
+    """Raised when a stage references a secret the provider does not have."""
+
+
+class FileSecretProvider:
+    """
+    Reads secrets from a local JSON file mapping namespaces to the names and
+    values of their secrets, for example {"team-a": {"DEPLOY_TOKEN": "..."}}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, namespace, names):
+        """
+        Looks up the secrets of a namespace by name.
+
+        Args:
+            namespace (str): The name of the namespace the secrets belong to.
+            names (list): The names of the secrets.
+
+        Returns:
+            dict: The value of each secret that exists, by name.
+        """
+        secrets = self._load().get(namespace, {})
+        return {name: str(secrets[name]) for name in names if name in secrets}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+
+class EncryptedFileSecretProvider(FileSecretProvider):
+    """
+    Reads secrets from a JSON file encrypted with Fernet.
+
+    Requires the optional 'cryptography' package. The file can be created with
+    Fernet(key).encrypt(json.dumps(secrets_by_namespace).encode()).
+    """
+
+    def __init__(self, path, key):
+        super().__init__(path)
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise RuntimeError(
+                "The encrypted secrets provider requires the 'cryptography' package."
+            )
+        if not key:
+            raise ValueError(
+                "No SECRETS_KEY set for the encrypted secrets provider. "
+                "Please set SECRETS_KEY environment variable."
+            )
+        self._fernet = Fernet(key)
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(self._fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return {}
+
+
+class SecretCache:
+    """
+    Short-lived cache of secret values shared by all runs.
+
+    Runs resolve every secret they reference once, when they start. The values
+    are kept for ttl seconds per namespace and name, so concurrent runs
+    referencing the same secrets only hit the provider once. Secrets that do
+    not exist are cached for ttl seconds too.
+
+    Each namespace has its own lock, so a slow provider fetch for one tenant
+    never holds up another tenant's runs.
+    """
+
+    def __init__(self, provider, ttl):
+        self.provider = provider
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, namespace, names, missing_ok=False):
+        """
+        Resolves secrets, fetching only expired or missing ones from the provider.
+
+        Args:
+            namespace (str): The name of the namespace the secrets belong to.
+            names (list): The names of the secrets.
+            missing_ok (bool): Leave out secrets that do not exist instead of raising.
+
+        Returns:
+            dict: The value of each secret, by name.
+
+        Raises:
+            SecretNotFound: If one of the secrets does not exist in the namespace.
+        """
+        if not names:
+            return {}
+        with self._lock:
+            lock = self._locks.setdefault(namespace, threading.Lock())
+        # Holding the namespace's lock while fetching makes concurrent runs that
+        # miss on the same secrets wait for a single provider call.
+        with lock:
+            now = time.monotonic()
+            values = {}
+            missing = []
+            for name in dict.fromkeys(names):
+                entry = self._entries.get((namespace, name))
+                if entry and entry[1] > now:
+                    values[name] = entry[0]
+                else:
+                    missing.append(name)
+            if missing:
+                metrics.incr("secret_provider_fetches")
+                fetched = self.provider.get(namespace, missing)
+                for name in missing:
+                    value = fetched.get(name)
+                    self._entries[(namespace, name)] = (value, now + self.ttl)
+                    values[name] = value
+        not_found = [name for name, value in values.items() if value is None]
+        if not_found and not missing_ok:
+            raise SecretNotFound(f"Secret not found: {', '.join(not_found)}")
+        return {name: value for name, value in values.items() if value is not None}
+
+    def clear(self):
+        """Drops every cached secret."""
+        with self._lock:
+            self._entries.clear()
+
+
+def redact(value, secrets):
+    """
+    Replaces secret values in strings, lists and dicts with a placeholder.
+
+    Args:
+        value: The string or JSON-like structure to redact.
+        secrets (iterable): The secret values to redact.
+
+    Returns:
+        A copy of value with every secret value replaced.
+    """
+    # Longest first, so a secret containing another one is fully replaced.
+    secrets = sorted(
+        (secret for secret in set(secrets) if secret), key=len, reverse=True
+    )
+    return _redact(value, secrets)
+
+
+def _redact(value, secrets):
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+        return value
+    if isinstance(value, list):
+        return [_redact(item, secrets) for item in value]
+    if isinstance(value, dict):
+        return {key: _redact(item, secrets) for key, item in value.items()}
+    return value
+
+
+def make_provider(name):
+    """
+    Creates the secret provider selected by SECRETS_PROVIDER.
+
+    Args:
+        name (str): Either "file" or "encrypted-file".
+
+    Returns:
+        FileSecretProvider: The configured provider.
+    """
+    if name == "file":
+        return FileSecretProvider(SECRETS_FILE)
+    if name == "encrypted-file":
+        return EncryptedFileSecretProvider(SECRETS_FILE, SECRETS_KEY)
+    raise ValueError(f"Unknown secrets provider: {name}")
+
+
+secret_cache = SecretCache(make_provider(SECRETS_PROVIDER), SECRETS_CACHE_TTL_S)
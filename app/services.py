@@ -1,12 +1,101 @@
-from flask import jsonify
-from .models import CommandType, pipelines
+import re
+from flask import jsonify, request
+from .cache import is_workspace_pattern
+from .engine import EngineUnavailable, engine
+from .models import CommandType, QuotaExceeded, RunStatus, runs
+from .scheduler import CronExpression, scheduler
+from .secret_store import redact, secret_cache
 
+ENV_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
-def create_pipeline(data):
+
+def _validate_stages(stages):
+    """
+    Validate the stages of a pipeline configuration.
+
+    Args:
+        stages (list): The stage configurations to validate.
+
+    Returns:
+        tuple: A JSON error response and status code if a stage is invalid,
+               or None if all stages are valid.
+    """
+    for stage in stages:
+        if not CommandType.is_valid(stage.get("type")):
+            return jsonify({"error": f"Invalid command type: {stage.get('type')}"}), 400
+        secrets = stage.get("secrets", [])
+        if not isinstance(secrets, list) or not all(
+            isinstance(name, str) and ENV_NAME_PATTERN.match(name) for name in secrets
+        ):
+            return jsonify({"error": "'secrets' must be a list of secret names"}), 400
+        env = stage.get("env", {})
+        if not isinstance(env, dict) or not all(
+            ENV_NAME_PATTERN.match(name) and isinstance(value, str)
+            for name, value in env.items()
+        ):
+            return (
+                jsonify({"error": "'env' must map variable names to strings"}),
+                400,
+            )
+        if stage["type"] == CommandType.RUN:
+            if "command" not in stage:
+                return jsonify({"error": "Missing 'command' for RUN stage"}), 400
+            inputs = stage.get("inputs", [])
+            if not isinstance(inputs, list) or not all(
+                isinstance(pattern, str) for pattern in inputs
+            ):
+                return (
+                    jsonify({"error": "'inputs' must be a list of file globs"}),
+                    400,
+                )
+            if not all(is_workspace_pattern(pattern) for pattern in inputs):
+                return (
+                    jsonify(
+                        {
+                            "error": "'inputs' must be relative paths inside the workspace"
+                        }
+                    ),
+                    400,
+                )
+            if not isinstance(stage.get("cache", False), bool):
+                return jsonify({"error": "'cache' must be a boolean"}), 400
+        if stage["type"] == CommandType.BUILD and "dockerfile" not in stage:
+            return jsonify({"error": "Missing 'dockerfile' for BUILD stage"}), 400
+        if stage["type"] == CommandType.DEPLOY and "manifest" not in stage:
+            return jsonify({"error": "Missing 'manifest' for DEPLOY stage"}), 400
+    return None
+
+
+def _parse_schedule(data):
+    """
+    Parse the optional 'schedule' cron expression of a pipeline configuration.
+
+    Args:
+        data (dict): The pipeline configuration data.
+
+    Returns:
+        tuple: The CronExpression, or None if the pipeline is not scheduled,
+               and a JSON error response and status code if the schedule is invalid.
+    """
+    if data.get("schedule") is None:
+        return None, None
+    if not isinstance(data["schedule"], str):
+        return None, (
+            jsonify({"error": "Invalid schedule, expected a cron expression"}),
+            400,
+        )
+    try:
+        return CronExpression(data["schedule"]), None
+    except ValueError as e:
+        return None, (jsonify({"error": f"Invalid schedule: {e}"}), 400)
+
+
+def create_pipeline(namespace, data):
     """
     Create a new pipeline.
 
     Args:
+        namespace (Namespace): The namespace to create the pipeline in.
         data (dict): The pipeline configuration data.
 
     Returns:
@@ -22,25 +111,30 @@ def create_pipeline(data):
             ),
             400,
         )
-    for stage in data.get("stages", []):
-        if not CommandType.is_valid(stage.get("type")):
-            return jsonify({"error": f"Invalid command type: {stage.get('type')}"}), 400
-        if stage["type"] == CommandType.RUN and "command" not in stage:
-            return jsonify({"error": "Missing 'command' for RUN stage"}), 400
-        if stage["type"] == CommandType.BUILD and "dockerfile" not in stage:
-            return jsonify({"error": "Missing 'dockerfile' for BUILD stage"}), 400
-        if stage["type"] == CommandType.DEPLOY and "manifest" not in stage:
-            return jsonify({"error": "Missing 'manifest' for DEPLOY stage"}), 400
-    pipeline_id = len(pipelines) + 1
-    pipelines[pipeline_id] = data
+    error = _validate_stages(data["stages"])
+    if error:
+        return error
+    cron, error = _parse_schedule(data)
+    if error:
+        return error
+    try:
+        pipeline_id = namespace.pipelines.add(data, namespace.max_pipelines)
+    except QuotaExceeded as e:
+        return jsonify({"error": str(e)}), 403
+    if cron:
+        scheduler.schedule(namespace, pipeline_id, cron)
     return jsonify({"id": pipeline_id}), 201
 
 
-def get_pipeline(pipeline_id):
+def get_pipeline(namespace, pipeline_id):
     """
     Retrieve the configuration of an existing pipeline by ID.
 
+    The values of the secrets the pipeline references are redacted from its
+    stages, in case they were also embedded in the configuration itself.
+
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         pipeline_id (int): The ID of the pipeline to retrieve.
 
     Returns:
@@ -48,19 +142,32 @@ def get_pipeline(pipeline_id):
                   or an error message.
     """
     try:
-        pipeline = pipelines.get(pipeline_id)
+        pipeline = namespace.pipelines.get(pipeline_id)
         if not pipeline:
             return jsonify({"error": "Pipeline not found"}), 404
-        return jsonify(pipeline)
+        secrets = secret_cache.resolve(
+            namespace.name,
+            [name for stage in pipeline["stages"] for name in stage.get("secrets", [])],
+            missing_ok=True,
+        ).values()
+        stages = [
+            {
+                key: value if key in ("type", "secrets") else redact(value, secrets)
+                for key, value in stage.items()
+            }
+            for stage in pipeline["stages"]
+        ]
+        return jsonify(dict(pipeline, stages=stages))
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
-def update_pipeline(pipeline_id, data):
+def update_pipeline(namespace, pipeline_id, data):
     """
     Update an existing pipeline configuration.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         pipeline_id (int): The ID of the pipeline to update.
         data (dict): The new pipeline configuration data.
 
@@ -68,7 +175,7 @@ def update_pipeline(pipeline_id, data):
         Response: A JSON response indicating the result of the update operation
                   or an error message.
     """
-    if pipeline_id not in pipelines:
+    if namespace.pipelines.get(pipeline_id) is None:
         return jsonify({"error": "Pipeline not found"}), 404
     if not isinstance(data, dict):
         return jsonify({"error": "Invalid input format, expected JSON"}), 400
@@ -79,24 +186,27 @@ def update_pipeline(pipeline_id, data):
             ),
             400,
         )
-    for stage in data.get("stages", []):
-        if not CommandType.is_valid(stage.get("type")):
-            return jsonify({"error": f"Invalid command type: {stage.get('type')}"}), 400
-        if stage["type"] == CommandType.RUN and "command" not in stage:
-            return jsonify({"error": "Missing 'command' for RUN stage"}), 400
-        if stage["type"] == CommandType.BUILD and "dockerfile" not in stage:
-            return jsonify({"error": "Missing 'dockerfile' for BUILD stage"}), 400
-        if stage["type"] == CommandType.DEPLOY and "manifest" not in stage:
-            return jsonify({"error": "Missing 'manifest' for DEPLOY stage"}), 400
-    pipelines[pipeline_id] = data
+    error = _validate_stages(data["stages"])
+    if error:
+        return error
+    cron, error = _parse_schedule(data)
+    if error:
+        return error
+    if not namespace.pipelines.replace(pipeline_id, data):
+        return jsonify({"error": "Pipeline not found"}), 404
+    if cron:
+        scheduler.schedule(namespace, pipeline_id, cron)
+    else:
+        scheduler.unschedule(namespace, pipeline_id)
     return jsonify({"message": "Pipeline updated"})
 
 
-def delete_pipeline(pipeline_id):
+def delete_pipeline(namespace, pipeline_id):
     """
     Delete a pipeline configuration by ID.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         pipeline_id (int): The ID of the pipeline to delete.
 
     Returns:
@@ -104,51 +214,99 @@ def delete_pipeline(pipeline_id):
                   or an error message.
     """
     try:
-        if pipeline_id not in pipelines:
+        if not namespace.pipelines.remove(pipeline_id):
             return jsonify({"error": "Pipeline not found"}), 404
-        del pipelines[pipeline_id]
+        scheduler.unschedule(namespace, pipeline_id)
         return jsonify({"message": "Pipeline deleted"})
     except Exception as e:
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
-def trigger_pipeline(pipeline_id):
+def trigger_pipeline(namespace, pipeline_id, wait=True):
     """
     Trigger the execution of a pipeline by ID.
 
     Args:
+        namespace (Namespace): The namespace of the pipeline.
         pipeline_id (int): The ID of the pipeline to trigger.
+        wait (bool): Run the pipeline before responding. Otherwise the run is
+            queued for the engine's workers and can be polled by its ID.
 
     Returns:
         Response: A JSON response indicating the result of the trigger operation,
                   or an error message.
     """
-    pipeline = pipelines.get(pipeline_id)
+    pipeline = namespace.pipelines.get(pipeline_id)
     if not pipeline:
         return jsonify({"error": "Pipeline not found"}), 404
 
-    for stage in pipeline.get("stages", []):
-        if stage["type"] == CommandType.RUN:
-            if "command" not in stage:
-                return jsonify({"error": "Missing 'command' for RUN stage"}), 400
-            print(f"Running command: {stage['command']}")
-        elif stage["type"] == CommandType.BUILD:
-            if "dockerfile" not in stage:
-                return jsonify({"error": "Missing 'dockerfile' for BUILD stage"}), 400
-            print(f"Building Docker image from: {stage['dockerfile']}")
-            # Simulate Docker build and push to ECR
-            print(
-                f"Successfully built and pushed Docker image from {stage['dockerfile']} to ECR"
-            )
-        elif stage["type"] == CommandType.DEPLOY:
-            if "manifest" not in stage:
-                return jsonify({"error": "Missing 'manifest' for DEPLOY stage"}), 400
-            print(f"Deploying Kubernetes manifest: {stage['manifest']}")
-            # Simulate kubectl apply
-            print(
-                f"Successfully applied Kubernetes manifest {stage['manifest']} to the cluster"
+    error = _validate_stages(pipeline.get("stages", []))
+    if error:
+        return error
+    try:
+        if not wait:
+            run = engine.submit(namespace, pipeline_id, pipeline["stages"])
+            return (
+                jsonify(
+                    {
+                        "message": "Pipeline queued",
+                        "run_id": run["id"],
+                        "status": RunStatus.QUEUED,
+                    }
+                ),
+                202,
             )
-        else:
-            return jsonify({"error": f"Unknown command type: {stage['type']}"}), 400
+        run = engine.trigger(namespace, pipeline_id, pipeline["stages"])
+    except QuotaExceeded as e:
+        return jsonify({"error": str(e)}), 429
+    except EngineUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    response = {
+        "message": "Pipeline triggered",
+        "run_id": run["id"],
+        "status": run["status"],
+        "stages": run["stages"],
+    }
+    if "error" in run:
+        response["error"] = run["error"]
+    return jsonify(response)
 
-    return jsonify({"message": "Pipeline triggered"})
+
+def list_pipelines(namespace):
+    """
+    List the IDs of all pipelines.
+
+    Args:
+        namespace (Namespace): The namespace to list the pipelines of.
+
+    Returns:
+        Response: A JSON response containing the sorted pipeline IDs.
+    """
+    return jsonify({"pipelines": namespace.pipelines.ids()})
+
+
+def get_run(namespace, pipeline_id, run_id):
+    """
+    Retrieve the status of a pipeline run.
+
+    The response carries an ETag, so pollers can send If-None-Match and get an
+    empty 304 response while the run has not changed.
+
+    Args:
+        namespace (Namespace): The namespace of the pipeline.
+        pipeline_id (int): The ID of the pipeline the run belongs to.
+        run_id (int): The ID of the run to retrieve.
+
+    Returns:
+        Response: A JSON response containing the run if found, or an error message.
+    """
+    run = runs.get(run_id)
+    if (
+        not run
+        or run["namespace"] != namespace.name
+        or run["pipeline_id"] != pipeline_id
+    ):
+        return jsonify({"error": "Run not found"}), 404
+    response = jsonify(run)
+    response.add_etag()
+    return response.make_conditional(request)
@@ -0,0 +1,16 @@
+"""
+Points the state the app keeps on disk at a temporary directory.
+
+This runs before the benchmark imports the app, so benchmark runs never replay
+or append to the run journal and stage cache of a real server.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+tmpdir = tempfile.mkdtemp(prefix="cicd-bench-")
+atexit.register(shutil.rmtree, tmpdir, True)
+os.environ["RUN_JOURNAL_PATH"] = os.path.join(tmpdir, "run-journal.log")
+os.environ["STAGE_CACHE_DIR"] = os.path.join(tmpdir, "stage-cache")
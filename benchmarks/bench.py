@@ -0,0 +1,503 @@
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import click
+import requests
+from requests.adapters import HTTPAdapter
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app import create_app
+from app.config import API_KEY
+from app.models import DEFAULT_NAMESPACE, TokenBucket, get_namespace
+
+SCENARIOS = {
+    "crud": {"create": 1, "get": 1, "update": 1, "delete": 1},
+    "read-heavy": {"create": 1, "get": 8, "update": 1},
+    "trigger": {"trigger": 1},
+    "mixed": {"create": 2, "get": 4, "update": 2, "delete": 1, "trigger": 1},
+    "writes": {"create": 1, "update": 2, "delete": 1},
+}
+TRANSPORTS = ("inprocess", "http")
+DEFAULT_STAGES = "1,10,100,1000"
+DEFAULT_CONCURRENCY = "1,16,64,256"
+DEFAULT_TENANTS = "1"
+
+
+def make_pipeline(size):
+    """
+    Builds a pipeline configuration with the given number of stages.
+
+    Args:
+        size (int): The number of stages, cycling through RUN, BUILD and DEPLOY.
+
+    Returns:
+        dict: The pipeline configuration.
+    """
+    kinds = [
+        {"type": "run", "command": "echo 'Running tests'"},
+        {"type": "build", "dockerfile": "Dockerfile"},
+        {"type": "deploy", "manifest": "k8s/deployment.yaml"},
+    ]
+    return {"stages": [dict(kinds[i % len(kinds)]) for i in range(size)]}
+
+
+def percentiles(samples):
+    """
+    Summarises latency samples.
+
+    Args:
+        samples (list): Latencies in seconds.
+
+    Returns:
+        dict: The p50, p95, p99, mean and max latencies in milliseconds.
+    """
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+class InProcessDriver:
+    """Sends requests through a Flask test client, one per worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}",
+        }
+        self._local = threading.local()
+
+    def request(self, method, path, data=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(
+            path,
+            method=method,
+            headers=self.headers,
+            data=json.dumps(data) if data is not None else None,
+        )
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class HttpDriver:
+    """Sends requests over real HTTP to a threaded server running the app."""
+
+    def __init__(self, app, pool_size):
+        self.server = make_server(
+            "127.0.0.1",
+            0,
+            app,
+            threaded=True,
+            request_handler=_QuietRequestHandler,
+        )
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {API_KEY}"})
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, json=data)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def close(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextlib.contextmanager
+def _unlimited_quotas(names):
+    """
+    Lifts the quotas and rate limits of namespaces for the duration of a run.
+
+    Otherwise high concurrency levels mostly measure how fast the API rejects
+    requests with 403 and 429. Both drivers run the app in this process, so
+    the namespaces can be changed directly.
+
+    Args:
+        names (list): The names of the namespaces the run uses.
+    """
+    namespaces = [get_namespace(name) for name in names]
+    saved = [
+        (namespace.max_pipelines, namespace.max_concurrent_runs, namespace.rate_limiter)
+        for namespace in namespaces
+    ]
+    for namespace in namespaces:
+        namespace.max_pipelines = sys.maxsize
+        namespace.max_concurrent_runs = sys.maxsize
+        namespace.rate_limiter = TokenBucket(0, 0)
+    try:
+        yield
+    finally:
+        for namespace, quotas in zip(namespaces, saved):
+            (
+                namespace.max_pipelines,
+                namespace.max_concurrent_runs,
+                namespace.rate_limiter,
+            ) = quotas
+
+
+def _create(driver, prefix, pipeline):
+    status, body = driver.request("POST", f"{prefix}/pipelines", pipeline)
+    if status != 201:
+        raise RuntimeError(f"create failed with status {status}")
+    return body["id"]
+
+
+def _run_operation(driver, operation, pipeline, prefix, pool, pool_lock):
+    """
+    Runs one operation of a scenario and times only the operation itself.
+
+    The operation targets the pipelines under prefix, which is empty for the
+    default namespace or "/namespaces/<name>" for another tenant.
+
+    Returns:
+        tuple: The latency in seconds and whether the response was a success.
+    """
+    if operation == "create":
+        start = time.perf_counter()
+        status, body = driver.request("POST", f"{prefix}/pipelines", pipeline)
+        elapsed = time.perf_counter() - start
+        if status == 201:
+            with pool_lock:
+                pool.append(body["id"])
+        return elapsed, status == 201
+
+    if operation == "delete":
+        # Deletes work on a fresh pipeline so the shared pool stays populated.
+        pipeline_id = _create(driver, prefix, pipeline)
+        start = time.perf_counter()
+        status, _ = driver.request("DELETE", f"{prefix}/pipelines/{pipeline_id}")
+        return time.perf_counter() - start, status == 200
+
+    with pool_lock:
+        pipeline_id = random.choice(pool)
+    path = f"{prefix}/pipelines/{pipeline_id}"
+    start = time.perf_counter()
+    if operation == "get":
+        status, _ = driver.request("GET", path)
+    elif operation == "update":
+        status, _ = driver.request("PUT", path, pipeline)
+    elif operation == "trigger":
+        status, _ = driver.request("POST", f"{path}/trigger")
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+    return time.perf_counter() - start, status == 200
+
+
+def run_scenario(
+    driver, scenario, size, concurrency, total_requests, tenants=1, seed=0
+):
+    """
+    Runs one scenario against a driver.
+
+    With more than one tenant, the clients are spread evenly over namespaces
+    "tenant-0" to "tenant-<n-1>", each working on its own pipelines. The
+    quotas of the namespaces used are lifted while the scenario runs.
+
+    Args:
+        driver: The InProcessDriver or HttpDriver to send requests through.
+        scenario (str): The name of the operation mix in SCENARIOS.
+        size (int): The number of stages in every pipeline.
+        concurrency (int): The number of concurrent clients.
+        total_requests (int): The number of measured operations across all clients.
+        tenants (int): The number of namespaces the clients are spread over.
+        seed (int): The seed for the operation choice.
+
+    Returns:
+        dict: Throughput, error count and latency percentiles, overall and per operation.
+    """
+    if tenants == 1:
+        names = [DEFAULT_NAMESPACE]
+        prefixes = [""]
+    else:
+        names = [f"tenant-{i}" for i in range(tenants)]
+        prefixes = [f"/namespaces/{name}" for name in names]
+    with _unlimited_quotas(names):
+        return _run_scenario(
+            driver, scenario, size, concurrency, total_requests, prefixes, seed
+        )
+
+
+def _run_scenario(driver, scenario, size, concurrency, total_requests, prefixes, seed):
+    weights = SCENARIOS[scenario]
+    operations = list(weights)
+    pipeline = make_pipeline(size)
+    tenants = len(prefixes)
+    pools = {
+        prefix: [
+            _create(driver, prefix, pipeline)
+            for _ in range(max(1, concurrency // tenants))
+        ]
+        for prefix in prefixes
+    }
+    pool_locks = {prefix: threading.Lock() for prefix in prefixes}
+    samples = {operation: [] for operation in operations}
+    errors = []
+    per_worker = [
+        total_requests // concurrency + (1 if i < total_requests % concurrency else 0)
+        for i in range(concurrency)
+    ]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        prefix = prefixes[index % tenants]
+        for _ in range(per_worker[index]):
+            operation = rng.choices(operations, [weights[o] for o in operations])[0]
+            try:
+                elapsed, ok = _run_operation(
+                    driver,
+                    operation,
+                    pipeline,
+                    prefix,
+                    pools[prefix],
+                    pool_locks[prefix],
+                )
+            except Exception:
+                errors.append(operation)
+                continue
+            samples[operation].append(elapsed)
+            if not ok:
+                errors.append(operation)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    duration = time.perf_counter() - start
+
+    for prefix, pool in pools.items():
+        for pipeline_id in pool:
+            driver.request("DELETE", f"{prefix}/pipelines/{pipeline_id}")
+
+    all_samples = [sample for values in samples.values() for sample in values]
+    return {
+        "scenario": scenario,
+        "stages": size,
+        "concurrency": concurrency,
+        "tenants": tenants,
+        "requests": len(all_samples),
+        "errors": len(errors),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(all_samples) / duration, 1) if duration else 0.0,
+        "latency_ms": percentiles(all_samples),
+        "operations": {
+            operation: percentiles(values)
+            for operation, values in samples.items()
+            if values
+        },
+    }
+
+
+def result_key(result):
+    return (
+        result["transport"],
+        result["scenario"],
+        result["stages"],
+        result["concurrency"],
+        result.get("tenants", 1),
+    )
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results against a baseline run.
+
+    A result regresses when its p95 or p99 latency grows, or its throughput
+    drops, by more than the threshold relative to the matching baseline result.
+
+    Args:
+        results (list): The results of the current run.
+        baseline (list): The results of the baseline run.
+        threshold (float): The tolerated relative change, e.g. 0.2 for 20%.
+
+    Returns:
+        list: A description of every regression found.
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        name = "{}/{} stages={} concurrency={} tenants={}".format(*result_key(result))
+        for metric in ("p95", "p99"):
+            before = old["latency_ms"][metric]
+            after = result["latency_ms"][metric]
+            if before and after > before * (1 + threshold):
+                regressions.append(f"{name}: {metric} latency {before}ms -> {after}ms")
+        before = old["throughput_rps"]
+        after = result["throughput_rps"]
+        if before and after < before * (1 - threshold):
+            regressions.append(f"{name}: throughput {before}rps -> {after}rps")
+    return regressions
+
+
+def _parse_ints(value):
+    try:
+        return [int(item) for item in value.split(",") if item]
+    except ValueError:
+        raise click.BadParameter("expected a comma-separated list of integers")
+
+
+@click.command()
+@click.option(
+    "--transport",
+    type=click.Choice(TRANSPORTS + ("all",)),
+    default="inprocess",
+    help="Drive the app through the test client, over HTTP, or both.",
+)
+@click.option(
+    "--scenario",
+    "scenarios",
+    type=click.Choice(sorted(SCENARIOS)),
+    multiple=True,
+    help="Operation mix to run, may be repeated (default: all).",
+)
+@click.option(
+    "--stages", default=DEFAULT_STAGES, help="Comma-separated pipeline sizes."
+)
+@click.option(
+    "--concurrency",
+    default=DEFAULT_CONCURRENCY,
+    help="Comma-separated numbers of concurrent clients.",
+)
+@click.option(
+    "--tenants",
+    default=DEFAULT_TENANTS,
+    help="Comma-separated numbers of namespaces to spread the clients over.",
+)
+@click.option(
+    "--requests", "total_requests", default=500, help="Measured requests per run."
+)
+@click.option("--output", type=click.Path(dir_okay=False), help="Write JSON here.")
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Baseline JSON to compare the results against.",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    help="Tolerated relative regression when comparing against a baseline.",
+)
+def main(
+    transport,
+    scenarios,
+    stages,
+    concurrency,
+    tenants,
+    total_requests,
+    output,
+    baseline,
+    threshold,
+):
+    """Benchmark the CI/CD Pipeline API and report latency percentiles as JSON."""
+    transports = TRANSPORTS if transport == "all" else (transport,)
+    sizes = _parse_ints(stages)
+    levels = _parse_ints(concurrency)
+    tenant_counts = _parse_ints(tenants)
+    app = create_app()
+    results = []
+    for name in transports:
+        driver = (
+            InProcessDriver(app)
+            if name == "inprocess"
+            else HttpDriver(app, max(levels))
+        )
+        try:
+            for scenario in scenarios or sorted(SCENARIOS):
+                for size in sizes:
+                    for level, count in itertools.product(levels, tenant_counts):
+                        # Pipeline stages print as they run; keep them out of the report.
+                        with open(os.devnull, "w") as devnull:
+                            with contextlib.redirect_stdout(devnull):
+                                result = run_scenario(
+                                    driver,
+                                    scenario,
+                                    size,
+                                    level,
+                                    total_requests,
+                                    tenants=count,
+                                )
+                        result["transport"] = name
+                        results.append(result)
+                        click.echo(
+                            "{}/{} stages={} concurrency={} tenants={}: p50={p50}ms "
+                            "p95={p95}ms p99={p99}ms".format(
+                                *result_key(result), **result["latency_ms"]
+                            )
+                            + (
+                                f" errors={result['errors']}"
+                                if result["errors"]
+                                else ""
+                            ),
+                            err=True,
+                        )
+        finally:
+            driver.close()
+
+    report = json.dumps({"results": results}, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(report + "\n")
+    else:
+        click.echo(report)
+
+    failed = False
+    # Latencies of failed requests would make a misleading baseline.
+    for result in results:
+        if result["errors"]:
+            click.echo(
+                "Errors: {}/{} stages={} concurrency={} tenants={}: ".format(
+                    *result_key(result)
+                )
+                + f"{result['errors']} of {result['requests']} requests failed",
+                err=True,
+            )
+            failed = True
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f)["results"], threshold)
+        for regression in regressions:
+            click.echo(f"Regression: {regression}", err=True)
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@ import click
 import requests
 import json
 import os
-from cli.config import API_URL, API_KEY
+import fnmatch
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from cli.config import API_URL, API_KEY, API_NAMESPACE
+
+TERMINAL_STATUSES = {"succeeded", "failed", "not found", "error", "timed out"}
 
 
 def get_headers(api_key):
@@ -13,6 +19,13 @@ def get_headers(api_key):
     return {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
 
+def pipelines_url(namespace):
+    """Build the URL of the pipelines of a namespace, or of the default namespace."""
+    if namespace:
+        return f"{API_URL}/namespaces/{namespace}/pipelines"
+    return f"{API_URL}/pipelines"
+
+
 @click.group()
 def cli():
     """CLI for interacting with the CI/CD Pipeline API."""
@@ -22,10 +35,17 @@ def cli():
 @click.command()
 @click.argument("pipeline_id", type=int)
 @click.option("--api-key", default=API_KEY, help="API key for authentication")
-def get_pipeline(pipeline_id, api_key):
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+def get_pipeline(pipeline_id, api_key, namespace):
     """Retrieve the configuration of pipeline by ID."""
     headers = get_headers(api_key)
-    response = requests.get(f"{API_URL}/pipelines/{pipeline_id}", headers=headers)
+    response = requests.get(
+        f"{pipelines_url(namespace)}/{pipeline_id}", headers=headers
+    )
     if response.status_code == 200:
         click.echo(response.json())
     elif response.status_code == 404:
@@ -37,11 +57,16 @@ def get_pipeline(pipeline_id, api_key):
 @click.command()
 @click.argument("pipeline_id", type=int)
 @click.option("--api-key", default=API_KEY, help="API key for authentication")
-def trigger_pipeline(pipeline_id, api_key):
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+def trigger_pipeline(pipeline_id, api_key, namespace):
     """Trigger the execution of a pipeline."""
     headers = get_headers(api_key)
     response = requests.post(
-        f"{API_URL}/pipelines/{pipeline_id}/trigger", headers=headers
+        f"{pipelines_url(namespace)}/{pipeline_id}/trigger", headers=headers
     )
     if response.status_code == 200:
         click.echo(response.json())
@@ -51,11 +76,203 @@ def trigger_pipeline(pipeline_id, api_key):
         click.echo(f"Error: {response.status_code} - {response.text}")
 
 
+def resolve_pipeline_ids(session, patterns, namespace=None):
+    """Expand IDs, ranges like '1-40' and globs like '1*' into pipeline IDs."""
+    ids = []
+    existing = None
+    for pattern in patterns:
+        if pattern.isdigit():
+            ids.append(int(pattern))
+        elif pattern.count("-") == 1 and pattern.replace("-", "").isdigit():
+            start, end = pattern.split("-")
+            if not (start.isdigit() and end.isdigit()) or int(start) > int(end):
+                raise click.BadParameter(
+                    f"'{pattern}' is not a range like 1-40", param_hint="PIPELINES"
+                )
+            ids.extend(range(int(start), int(end) + 1))
+        else:
+            if existing is None:
+                response = session.get(pipelines_url(namespace))
+                if response.status_code != 200:
+                    raise click.ClickException(
+                        f"Could not list pipelines: {response.status_code} - {response.text}"
+                    )
+                existing = response.json()["pipelines"]
+            ids.extend(
+                pipeline_id
+                for pipeline_id in existing
+                if fnmatch.fnmatch(str(pipeline_id), pattern)
+            )
+    return list(dict.fromkeys(ids))
+
+
+def render_runs(runs):
+    """Format the state of the triggered runs as a table."""
+    lines = [f"{'PIPELINE':<10} {'RUN':<8} STATUS"]
+    for pipeline_id, run in runs.items():
+        run_id = run.get("run_id") or "-"
+        lines.append(f"{pipeline_id:<10} {run_id:<8} {run['status']}")
+    return lines
+
+
+@click.command()
+@click.argument("pipelines", nargs=-1, required=True)
+@click.option("--api-key", default=API_KEY, help="API key for authentication")
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+@click.option("--concurrency", default=8, help="Maximum number of parallel requests")
+@click.option("--poll-interval", default=1.0, help="Initial seconds between polls")
+@click.option("--max-poll-interval", default=15.0, help="Maximum seconds between polls")
+@click.option(
+    "--timeout", default=3600.0, help="Seconds to wait for the runs to finish"
+)
+def trigger_many(
+    pipelines,
+    api_key,
+    namespace,
+    concurrency,
+    poll_interval,
+    max_poll_interval,
+    timeout,
+):
+    """Trigger many pipelines and watch them until they finish.
+
+    PIPELINES are IDs, ranges like 1-40 or globs like '1*'. Exits with a
+    non-zero code if any pipeline fails.
+    """
+    headers = get_headers(api_key)
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    pipeline_ids = resolve_pipeline_ids(session, pipelines, namespace)
+    if not pipeline_ids:
+        raise click.ClickException("No pipelines matched.")
+    runs = {pipeline_id: {"status": "triggering"} for pipeline_id in pipeline_ids}
+
+    def trigger(pipeline_id):
+        run = runs[pipeline_id]
+        try:
+            # Queue the run instead of waiting for it, so it can be watched.
+            response = session.post(
+                f"{pipelines_url(namespace)}/{pipeline_id}/trigger",
+                params={"wait": "false"},
+            )
+        except requests.RequestException as e:
+            run["status"] = "error"
+            run["error"] = str(e)
+            return
+        if response.status_code in (200, 202):
+            body = response.json()
+            run["run_id"] = body.get("run_id")
+            run["status"] = body.get("status", "queued")
+        elif response.status_code == 404:
+            run["status"] = "not found"
+        else:
+            run["status"] = "error"
+            run["error"] = f"{response.status_code} - {response.text}"
+        run["interval"] = poll_interval
+        run["next_poll"] = time.monotonic() + poll_interval
+
+    def poll(pipeline_id):
+        run = runs[pipeline_id]
+        conditional = {"If-None-Match": run["etag"]} if run.get("etag") else {}
+        try:
+            response = session.get(
+                f"{pipelines_url(namespace)}/{pipeline_id}/runs/{run['run_id']}",
+                headers=conditional,
+            )
+        except requests.RequestException:
+            response = None
+        if response is not None and response.status_code == 200:
+            changed = response.json()["status"] != run["status"]
+            run["status"] = response.json()["status"]
+            run["etag"] = response.headers.get("ETag")
+        elif response is not None and response.status_code == 404:
+            run["status"] = "not found"
+            return
+        else:
+            changed = False
+        # Back off while a run is unchanged, poll quickly again once it moves.
+        run["interval"] = (
+            poll_interval if changed else min(run["interval"] * 2, max_poll_interval)
+        )
+        run["next_poll"] = time.monotonic() + run["interval"]
+
+    live = click.get_text_stream("stdout").isatty()
+    drawn = 0
+
+    def draw():
+        nonlocal drawn
+        lines = render_runs(runs)
+        if drawn:
+            click.echo(f"\x1b[{drawn}F", nl=False)
+        click.echo("\n".join(f"{line}\x1b[K" for line in lines))
+        drawn = len(lines)
+
+    deadline = time.monotonic() + timeout
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        triggers = [
+            executor.submit(trigger, pipeline_id) for pipeline_id in pipeline_ids
+        ]
+        for _ in as_completed(triggers):
+            if live:
+                draw()
+        while True:
+            pending = [
+                pipeline_id
+                for pipeline_id, run in runs.items()
+                if run["status"] not in TERMINAL_STATUSES
+            ]
+            if live:
+                draw()
+            if not pending:
+                break
+            now = time.monotonic()
+            if now >= deadline:
+                for pipeline_id in pending:
+                    runs[pipeline_id]["status"] = "timed out"
+                break
+            due = [
+                pipeline_id
+                for pipeline_id in pending
+                if runs[pipeline_id]["next_poll"] <= now
+            ]
+            if due:
+                list(executor.map(poll, due))
+            else:
+                next_poll = min(
+                    runs[pipeline_id]["next_poll"] for pipeline_id in pending
+                )
+                time.sleep(max(0, min(next_poll, deadline) - now))
+
+    if not live:
+        click.echo("\n".join(render_runs(runs)))
+    for pipeline_id, run in runs.items():
+        if "error" in run:
+            click.echo(f"Error: pipeline {pipeline_id}: {run['error']}", err=True)
+    failed = [
+        pipeline_id for pipeline_id, run in runs.items() if run["status"] != "succeeded"
+    ]
+    if failed:
+        raise SystemExit(1)
+
+
 @click.command()
 @click.argument("pipeline_id", type=int)
 @click.argument("pipeline_data", type=str)
 @click.option("--api-key", default=API_KEY, help="API key for authentication")
-def update_pipeline(pipeline_id, pipeline_data, api_key):
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+def update_pipeline(pipeline_id, pipeline_data, api_key, namespace):
     """Update an existing pipeline configuration."""
     try:
         data = json.loads(pipeline_data)
@@ -65,7 +282,7 @@ def update_pipeline(pipeline_id, pipeline_data, api_key):
 
     headers = get_headers(api_key)
     response = requests.put(
-        f"{API_URL}/pipelines/{pipeline_id}", json=data, headers=headers
+        f"{pipelines_url(namespace)}/{pipeline_id}", json=data, headers=headers
     )
     if response.status_code == 200:
         click.echo(response.json())
@@ -80,7 +297,12 @@ def update_pipeline(pipeline_id, pipeline_data, api_key):
 @click.command()
 @click.argument("pipeline_data", type=str)
 @click.option("--api-key", default=API_KEY, help="API key for authentication")
-def create_pipeline(pipeline_data, api_key):
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+def create_pipeline(pipeline_data, api_key, namespace):
     """Create a new CI/CD pipeline configuration."""
     try:
         data = json.loads(pipeline_data)
@@ -89,7 +311,7 @@ def create_pipeline(pipeline_data, api_key):
         return
 
     headers = get_headers(api_key)
-    response = requests.post(f"{API_URL}/pipelines", json=data, headers=headers)
+    response = requests.post(pipelines_url(namespace), json=data, headers=headers)
     if response.status_code == 201:
         click.echo(response.json())
     elif response.status_code == 400:
@@ -103,10 +325,17 @@ def create_pipeline(pipeline_data, api_key):
 @click.command()
 @click.argument("pipeline_id", type=int)
 @click.option("--api-key", default=API_KEY, help="API key for authentication")
-def delete_pipeline(pipeline_id, api_key):
+@click.option(
+    "--namespace",
+    default=API_NAMESPACE,
+    help="Namespace of the pipelines (default: the 'default' namespace)",
+)
+def delete_pipeline(pipeline_id, api_key, namespace):
     """Delete a pipeline configuration."""
     headers = get_headers(api_key)
-    response = requests.delete(f"{API_URL}/pipelines/{pipeline_id}", headers=headers)
+    response = requests.delete(
+        f"{pipelines_url(namespace)}/{pipeline_id}", headers=headers
+    )
     if response.status_code == 200:
         click.echo(response.json())
     elif response.status_code == 404:
@@ -123,6 +352,7 @@ def help():
 
 cli.add_command(get_pipeline)
 cli.add_command(trigger_pipeline)
+cli.add_command(trigger_many)
 cli.add_command(update_pipeline)
 cli.add_command(create_pipeline)
 cli.add_command(delete_pipeline)
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 API_URL = os.getenv("API_URL", "http://127.0.0.1:5000")
+API_NAMESPACE = os.getenv("API_NAMESPACE")
 
 API_KEY = os.getenv("API_KEY")
 if not API_KEY:
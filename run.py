@@ -1,6 +1,18 @@
+import os
 from app import create_app
+from app.config import DEBUG_RELOADER
+from app.engine import engine
 
-app = create_app()
+# With DEBUG_RELOADER, the debug reloader runs this script in a parent process
+# that only watches files and a child that serves requests; only the child may
+# replay the run journal and run pipelines.
+app = create_app(
+    start_services=__name__ != "__main__"
+    or not DEBUG_RELOADER
+    or os.getenv("WERKZEUG_RUN_MAIN") == "true"
+)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # The reloader replaces this handler with an immediate exit.
+    engine.install_signal_handler()
+    app.run(debug=True, use_reloader=DEBUG_RELOADER)
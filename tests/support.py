@@ -0,0 +1,16 @@
+"""
+Points the state the app keeps on disk at a temporary directory.
+
+Test modules import this before the app, so test runs never replay or append
+to the run journal and stage cache of a real server.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+tmpdir = tempfile.mkdtemp(prefix="cicd-tests-")
+atexit.register(shutil.rmtree, tmpdir, True)
+os.environ["RUN_JOURNAL_PATH"] = os.path.join(tmpdir, "run-journal.log")
+os.environ["STAGE_CACHE_DIR"] = os.path.join(tmpdir, "stage-cache")
@@ -1,7 +1,13 @@
 import unittest
 import json
+import tempfile
+import time
+from unittest.mock import patch
+import support  # noqa: F401
 from app import create_app
-from app.config import API_KEY
+from app.cache import stage_cache
+from app.config import API_KEY, API_TOKENS
+from app.models import TokenBucket, get_namespace
 
 
 class PipelineTestCase(unittest.TestCase):
@@ -176,11 +182,220 @@ class PipelineTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json["message"], "Pipeline triggered")
 
+    def test_trigger_pipeline_without_waiting(self):
+        data = {"stages": [{"type": "run", "command": "echo 'Running tests'"}]}
+        create_response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        pipeline_id = create_response.json["id"]
+
+        response = self.client.post(
+            f"/pipelines/{pipeline_id}/trigger?wait=false", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json["status"], "queued")
+
+        run_url = f"/pipelines/{pipeline_id}/runs/{response.json['run_id']}"
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            status = self.client.get(run_url, headers=self.headers).json["status"]
+            if status == "succeeded":
+                break
+            time.sleep(0.01)
+        self.assertEqual(status, "succeeded")
+
     def test_trigger_non_existent_pipeline(self):
         response = self.client.post("/pipelines/999/trigger", headers=self.headers)
         self.assertEqual(response.status_code, 404)
         self.assertIn("Pipeline not found", response.json["error"])
 
+    def test_create_pipeline_invalid_cache_options(self):
+        data = {"stages": [{"type": "run", "command": "make lint", "inputs": "*.py"}]}
+        response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'inputs' must be a list of file globs", response.json["error"])
+
+        data = {"stages": [{"type": "run", "command": "make lint", "cache": "yes"}]}
+        response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'cache' must be a boolean", response.json["error"])
+
+        for pattern in ["/etc/*", "/**", "../secrets/*", "app/../../*"]:
+            data = {
+                "stages": [{"type": "run", "command": "make lint", "inputs": [pattern]}]
+            }
+            response = self.client.post(
+                "/pipelines", headers=self.headers, data=json.dumps(data)
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("inside the workspace", response.json["error"])
+
+    def test_trigger_pipeline_cached_stage(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        patcher = patch.object(stage_cache, "directory", tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Create a pipeline
+        data = {
+            "stages": [
+                {
+                    "type": "run",
+                    "command": "make lint",
+                    "inputs": ["app/*.py"],
+                    "cache": True,
+                },
+                {"type": "build", "dockerfile": "Dockerfile"},
+            ]
+        }
+        create_response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        pipeline_id = create_response.json["id"]
+        hits = self.client.get("/metrics", headers=self.headers).json.get(
+            "stage_cache_hits", 0
+        )
+
+        # Trigger the pipeline twice
+        first = self.client.post(
+            f"/pipelines/{pipeline_id}/trigger", headers=self.headers
+        )
+        second = self.client.post(
+            f"/pipelines/{pipeline_id}/trigger", headers=self.headers
+        )
+        self.assertEqual(first.json["status"], "succeeded")
+        self.assertFalse(first.json["stages"][0]["cached"])
+        self.assertTrue(second.json["stages"][0]["cached"])
+        self.assertEqual(second.json["stages"][0]["exit_status"], 0)
+
+        metrics = self.client.get("/metrics", headers=self.headers)
+        self.assertEqual(metrics.status_code, 200)
+        self.assertEqual(metrics.json["stage_cache_hits"], hits + 1)
+
+    def test_list_pipelines(self):
+        data = {"stages": [{"type": "run", "command": "echo 'Running tests'"}]}
+        create_response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        response = self.client.get("/pipelines", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(create_response.json["id"], response.json["pipelines"])
+
+    def test_get_run(self):
+        # Create and trigger a pipeline
+        data = {"stages": [{"type": "run", "command": "echo 'Running tests'"}]}
+        create_response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        pipeline_id = create_response.json["id"]
+        trigger_response = self.client.post(
+            f"/pipelines/{pipeline_id}/trigger", headers=self.headers
+        )
+        run_id = trigger_response.json["run_id"]
+
+        # Get the run
+        response = self.client.get(
+            f"/pipelines/{pipeline_id}/runs/{run_id}", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["status"], "succeeded")
+        self.assertEqual(response.json["pipeline_id"], pipeline_id)
+
+        # Poll again with the ETag
+        response = self.client.get(
+            f"/pipelines/{pipeline_id}/runs/{run_id}",
+            headers=dict(self.headers, **{"If-None-Match": response.headers["ETag"]}),
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_non_existent_run(self):
+        response = self.client.get("/pipelines/1/runs/999", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("Run not found", response.json["error"])
+
+
+class NamespaceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}",
+        }
+        self.data = {"stages": [{"type": "run", "command": "echo 'Running tests'"}]}
+
+    def create(self, namespace, headers=None):
+        return self.client.post(
+            f"/namespaces/{namespace}/pipelines",
+            headers=headers or self.headers,
+            data=json.dumps(self.data),
+        )
+
+    def test_namespaces_are_isolated(self):
+        pipeline_id = self.create("isolated-a").json["id"]
+
+        response = self.client.get(
+            f"/namespaces/isolated-a/pipelines/{pipeline_id}", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["stages"], self.data["stages"])
+        self.assertNotIn(
+            pipeline_id,
+            self.client.get(
+                "/namespaces/isolated-b/pipelines", headers=self.headers
+            ).json["pipelines"],
+        )
+
+    def test_pipeline_ids_are_not_reused(self):
+        first = self.create("reuse").json["id"]
+        second = self.create("reuse").json["id"]
+        self.client.delete(f"/namespaces/reuse/pipelines/{first}", headers=self.headers)
+        third = self.create("reuse").json["id"]
+        self.assertEqual(len({first, second, third}), 3)
+
+    def test_token_restricted_to_namespaces(self):
+        patcher = patch.dict(API_TOKENS, {"team_token": {"team-a"}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        headers = dict(self.headers, Authorization="Bearer team_token")
+
+        self.assertEqual(self.create("team-a", headers).status_code, 201)
+        self.assertEqual(self.create("team-b", headers).status_code, 403)
+        response = self.client.get("/pipelines/1", headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_namespace(self):
+        response = self.create("Not_Valid")
+        self.assertEqual(response.status_code, 404)
+
+    def test_pipeline_quota(self):
+        get_namespace("pipeline-quota").max_pipelines = 1
+        self.assertEqual(self.create("pipeline-quota").status_code, 201)
+        response = self.create("pipeline-quota")
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("Pipeline quota of 1 exceeded", response.json["error"])
+
+    def test_concurrent_run_quota(self):
+        get_namespace("run-quota").max_concurrent_runs = 0
+        pipeline_id = self.create("run-quota").json["id"]
+        response = self.client.post(
+            f"/namespaces/run-quota/pipelines/{pipeline_id}/trigger",
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_rate_limit(self):
+        get_namespace("rate-limited").rate_limiter = TokenBucket(0.001, 1)
+        self.assertEqual(self.create("rate-limited").status_code, 201)
+        response = self.create("rate-limited")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Rate limit exceeded", response.json["error"])
+
 
 if __name__ == "__main__":
     unittest.main()
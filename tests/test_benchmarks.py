@@ -0,0 +1,82 @@
+import contextlib
+import io
+import unittest
+from unittest.mock import patch
+from click.testing import CliRunner
+import support  # noqa: F401
+from app import create_app
+from app.models import get_namespace
+from benchmarks.bench import (
+    InProcessDriver,
+    compare,
+    main,
+    percentiles,
+    run_scenario,
+)
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_percentiles(self):
+        summary = percentiles([i / 1000 for i in range(1, 101)])
+        self.assertEqual(summary["p50"], 50.0)
+        self.assertEqual(summary["p95"], 95.0)
+        self.assertEqual(summary["p99"], 99.0)
+        self.assertEqual(summary["max"], 100.0)
+
+    def test_compare_flags_regressions(self):
+        baseline = [
+            {
+                "transport": "inprocess",
+                "scenario": "crud",
+                "stages": 1,
+                "concurrency": 1,
+                "throughput_rps": 1000.0,
+                "latency_ms": {"p95": 1.0, "p99": 2.0},
+            }
+        ]
+        faster = [dict(baseline[0], latency_ms={"p95": 0.9, "p99": 2.1})]
+        slower = [dict(baseline[0], throughput_rps=500.0)]
+        self.assertEqual(compare(faster, baseline, 0.2), [])
+        self.assertEqual(len(compare(slower, baseline, 0.2)), 1)
+
+    def test_run_scenario_in_process(self):
+        driver = InProcessDriver(create_app())
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_scenario(driver, "mixed", 3, 2, 20)
+        self.assertEqual(result["requests"], 20)
+        self.assertEqual(result["errors"], 0)
+        self.assertIn("p99", result["latency_ms"])
+
+    def test_run_scenario_lifts_namespace_quotas(self):
+        namespace = get_namespace("tenant-1")
+        self.addCleanup(
+            setattr, namespace, "max_concurrent_runs", namespace.max_concurrent_runs
+        )
+        namespace.max_concurrent_runs = 0
+        driver = InProcessDriver(create_app())
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_scenario(driver, "trigger", 3, 4, 20, tenants=2)
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(namespace.max_concurrent_runs, 0)
+
+    def test_main_fails_on_errors(self):
+        result = {
+            "scenario": "trigger",
+            "stages": 1,
+            "concurrency": 1,
+            "tenants": 1,
+            "requests": 10,
+            "errors": 3,
+            "throughput_rps": 100.0,
+            "latency_ms": percentiles([0.001]),
+        }
+        with patch("benchmarks.bench.run_scenario", return_value=result):
+            outcome = CliRunner().invoke(
+                main, ["--scenario", "trigger", "--stages", "1", "--concurrency", "1"]
+            )
+        self.assertEqual(outcome.exit_code, 1)
+        self.assertIn("3 of 10 requests failed", outcome.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
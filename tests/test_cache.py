@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+import support  # noqa: F401
+from app.cache import StageCache
+
+
+class StageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.workspace = os.path.join(self.tmpdir.name, "workspace")
+        os.makedirs(self.workspace)
+        self.cache = StageCache(
+            os.path.join(self.tmpdir.name, "cache"), 1024 * 1024, self.workspace
+        )
+        self.input_path = os.path.join(self.workspace, "input.txt")
+        with open(self.input_path, "w") as f:
+            f.write("original")
+        self.stage = {
+            "type": "run",
+            "command": "echo 'Running tests'",
+            "inputs": ["*.txt"],
+            "cache": True,
+        }
+
+    def test_get_after_put(self):
+        key = self.cache.key(self.stage)
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, {"exit_status": 0, "log": ["ok"]})
+        self.assertEqual(self.cache.get(key), {"exit_status": 0, "log": ["ok"]})
+
+    def test_key_changes_with_inputs(self):
+        key = self.cache.key(self.stage)
+        self.assertEqual(key, self.cache.key(dict(self.stage)))
+
+        with open(self.input_path, "w") as f:
+            f.write("changed")
+        self.assertNotEqual(key, self.cache.key(self.stage))
+
+    def test_key_changes_with_command(self):
+        other = dict(self.stage, command="echo 'Running lint'")
+        self.assertNotEqual(self.cache.key(self.stage), self.cache.key(other))
+
+    def test_key_ignores_files_outside_workspace(self):
+        outside_path = os.path.join(self.tmpdir.name, "outside.txt")
+        with open(outside_path, "w") as f:
+            f.write("original")
+        os.symlink(outside_path, os.path.join(self.workspace, "link.txt"))
+        stages = [
+            dict(self.stage, inputs=["*.txt"]),
+            dict(self.stage, inputs=["../*.txt"]),
+            dict(self.stage, inputs=[outside_path]),
+        ]
+        keys = [self.cache.key(stage) for stage in stages]
+
+        with open(outside_path, "w") as f:
+            f.write("changed")
+        self.assertEqual(keys, [self.cache.key(stage) for stage in stages])
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("first", {"exit_status": 0, "log": ["x" * 100]})
+        entry_size = os.path.getsize(os.path.join(self.cache.directory, "first.json"))
+        self.cache.max_bytes = entry_size * 2
+
+        self.cache.put("second", {"exit_status": 0, "log": ["x" * 100]})
+        os.utime(os.path.join(self.cache.directory, "first.json"), (0, 0))
+        os.utime(os.path.join(self.cache.directory, "second.json"), (1, 1))
+        self.cache.get("first")
+        self.cache.put("third", {"exit_status": 0, "log": ["x" * 100]})
+
+        self.assertIsNotNone(self.cache.get("first"))
+        self.assertIsNone(self.cache.get("second"))
+        self.assertIsNotNone(self.cache.get("third"))
+
+    def test_index_survives_restart(self):
+        self.cache.put("first", {"exit_status": 0, "log": ["x" * 100]})
+        self.cache.put("second", {"exit_status": 0, "log": ["x" * 100]})
+        os.utime(os.path.join(self.cache.directory, "first.json"), (0, 0))
+        entry_size = os.path.getsize(os.path.join(self.cache.directory, "first.json"))
+
+        cache = StageCache(self.cache.directory, entry_size * 2, self.workspace)
+        cache.put("third", {"exit_status": 0, "log": ["x" * 100]})
+
+        self.assertIsNone(cache.get("first"))
+        self.assertIsNotNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -23,6 +23,20 @@ class CLITestCase(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertIn("Pipeline not found", result.output)
 
+    @patch("cli.cli.requests.get")
+    def test_get_pipeline_in_namespace(self, mock_get):
+        mock_get.return_value = Mock(status_code=200)
+        mock_get.return_value.json.return_value = {"stages": []}
+
+        result = self.runner.invoke(
+            cli,
+            ["get-pipeline", "1", "--namespace", "team-a", "--api-key", self.api_key],
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue(
+            mock_get.call_args.args[0].endswith("/namespaces/team-a/pipelines/1")
+        )
+
     @patch("cli.cli.requests.post")
     def test_create_pipeline(self, mock_post):
         mock_response = Mock()
@@ -149,6 +163,104 @@ class CLITestCase(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertIn("Error: 500 - Internal Server Error", result.output)
 
+    @patch("cli.cli.time.sleep")
+    @patch("cli.cli.requests.Session")
+    def test_trigger_many(self, mock_session_class, mock_sleep):
+        session = mock_session_class.return_value
+        session.headers = {}
+
+        def post(url, params=None):
+            self.assertEqual(params, {"wait": "false"})
+            response = Mock()
+            response.status_code = 202
+            run_id = int(url.split("/")[-2])
+            response.json.return_value = {"run_id": run_id, "status": "queued"}
+            return response
+
+        polls = {
+            "1": [
+                (200, "running", '"a"'),
+                (304, None, None),
+                (200, "succeeded", '"b"'),
+            ],
+            "2": [(200, "succeeded", '"c"')],
+        }
+
+        def get(url, headers=None):
+            status_code, status, etag = polls[url.split("/")[-3]].pop(0)
+            response = Mock()
+            response.status_code = status_code
+            response.json.return_value = {"status": status}
+            response.headers = {"ETag": etag}
+            return response
+
+        session.post.side_effect = post
+        session.get.side_effect = get
+
+        result = self.runner.invoke(
+            cli,
+            ["trigger-many", "1-2", "--poll-interval", "0", "--api-key", self.api_key],
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("succeeded", result.output)
+        self.assertEqual(session.get.call_count, 4)
+        last_poll = session.get.call_args_list[-1]
+        self.assertEqual(last_poll.kwargs["headers"], {"If-None-Match": '"a"'})
+
+    @patch("cli.cli.requests.Session")
+    def test_trigger_many_failure(self, mock_session_class):
+        session = mock_session_class.return_value
+        session.headers = {}
+        succeeded = Mock(status_code=200)
+        succeeded.json.return_value = {"run_id": 1, "status": "succeeded"}
+        failed = Mock(status_code=200)
+        failed.json.return_value = {"run_id": 2, "status": "failed"}
+        session.post.side_effect = [succeeded, failed]
+
+        result = self.runner.invoke(
+            cli,
+            ["trigger-many", "1", "2", "--concurrency", "1", "--api-key", self.api_key],
+        )
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("failed", result.output)
+        session.get.assert_not_called()
+
+    @patch("cli.cli.requests.Session")
+    def test_trigger_many_in_namespace(self, mock_session_class):
+        session = mock_session_class.return_value
+        session.headers = {}
+        session.get.return_value = Mock(status_code=200)
+        session.get.return_value.json.return_value = {"pipelines": [3]}
+        session.post.return_value = Mock(status_code=200)
+        session.post.return_value.json.return_value = {
+            "run_id": 1,
+            "status": "succeeded",
+        }
+
+        result = self.runner.invoke(
+            cli,
+            ["trigger-many", "*", "--namespace", "team-a", "--api-key", self.api_key],
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue(
+            session.get.call_args.args[0].endswith("/namespaces/team-a/pipelines")
+        )
+        self.assertTrue(
+            session.post.call_args.args[0].endswith(
+                "/namespaces/team-a/pipelines/3/trigger"
+            )
+        )
+
+    @patch("cli.cli.requests.Session")
+    def test_trigger_many_invalid_range(self, mock_session_class):
+        for pattern in ["5-", "-5", "5-1"]:
+            result = self.runner.invoke(
+                cli, ["trigger-many", "--api-key", self.api_key, "--", pattern]
+            )
+            self.assertEqual(result.exit_code, 2)
+            self.assertIn(f"'{pattern}' is not a range", result.output)
+        mock_session_class.return_value.post.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
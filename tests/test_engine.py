@@ -0,0 +1,267 @@
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from unittest.mock import patch
+import support  # noqa: F401
+from app.engine import EngineUnavailable, RunEngine
+from app.journal import JournalInUse, RunJournal, fcntl
+from app.models import DEFAULT_NAMESPACE, RunStore, get_namespace
+
+STAGES = [
+    {"type": "run", "command": "echo 'Running tests'"},
+    {"type": "build", "dockerfile": "Dockerfile"},
+    {"type": "deploy", "manifest": "k8s/deployment.yaml"},
+]
+
+STAGES_WITH_CRASH = [
+    {"type": "run", "command": "echo 'Running tests'"},
+    {"type": "run", "command": "crash"},
+    {"type": "deploy", "manifest": "k8s/deployment.yaml"},
+]
+
+
+class RunEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "journal.log")
+        patcher = patch("sys.stdout", new_callable=io.StringIO)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_journal(self, events, torn_line=False):
+        with open(self.path, "w") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+            if torn_line:
+                f.write('{"event": "stage_sta')
+
+    def start_engine(self, resume=True):
+        engine = RunEngine(self.path, 1024 * 1024, 0.01, 1, resume)
+        engine.start()
+        self.addCleanup(engine.shutdown, 5)
+        return engine
+
+    def test_journal_replay_tracks_open_runs(self):
+        self.write_journal(
+            [
+                {"event": "run_started", "run_id": 1, "pipeline_id": 1, "stages": []},
+                {"event": "run_completed", "run_id": 1, "status": "succeeded"},
+                {"event": "run_started", "run_id": 2, "pipeline_id": 1, "stages": []},
+            ],
+            torn_line=True,
+        )
+        journal = RunJournal(self.path, 1024, 0)
+        open_runs = journal.open()
+        self.addCleanup(journal.close)
+        self.assertEqual(list(open_runs), [2])
+
+        seq = journal.append(
+            {"event": "run_completed", "run_id": 2, "status": "failed"}
+        )
+        journal.sync(seq)
+        journal.compact(force=True)
+        with open(self.path) as f:
+            self.assertEqual(
+                [json.loads(line) for line in f], [{"event": "run_ids", "last": 2}]
+            )
+        self.assertEqual(journal.last_run_id, 2)
+
+    @unittest.skipUnless(fcntl, "flock is not available")
+    def test_journal_cannot_be_opened_twice(self):
+        journal = RunJournal(self.path, 1024, 0)
+        journal.open()
+        engine = RunEngine(self.path, 1024, 0, 1, True)
+        with self.assertRaises(JournalInUse):
+            engine.start()
+
+        journal.close()
+        engine.start()
+        self.addCleanup(engine.shutdown, 5)
+        self.assertEqual(engine.journal.last_run_id, 0)
+
+    def test_resumes_run_from_last_completed_stage(self):
+        self.write_journal(
+            [
+                {
+                    "event": "run_started",
+                    "run_id": 1001,
+                    "pipeline_id": 7,
+                    "stages": STAGES,
+                },
+                {"event": "stage_started", "run_id": 1001, "index": 0},
+                {
+                    "event": "stage_completed",
+                    "run_id": 1001,
+                    "index": 0,
+                    "result": {"type": "run", "exit_status": 0, "cached": False},
+                },
+            ]
+        )
+        engine = self.start_engine()
+        self.assertTrue(engine.shutdown(5))
+
+        with open(self.path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(
+            [event["index"] for event in events if event["event"] == "stage_started"],
+            [0, 1, 2],
+        )
+        self.assertEqual(events[-1]["event"], "run_completed")
+        self.assertEqual(events[-1]["status"], "succeeded")
+
+    def test_interrupted_deploy_fails_run(self):
+        self.write_journal(
+            [
+                {
+                    "event": "run_started",
+                    "run_id": 1002,
+                    "pipeline_id": 7,
+                    "stages": STAGES,
+                },
+                {"event": "stage_started", "run_id": 1002, "index": 0},
+                {
+                    "event": "stage_completed",
+                    "run_id": 1002,
+                    "index": 0,
+                    "result": {"type": "run", "exit_status": 0, "cached": False},
+                },
+                {"event": "stage_started", "run_id": 1002, "index": 1},
+            ]
+        )
+        from app.models import runs
+
+        self.start_engine()
+        self.assertEqual(runs.get(1002)["status"], "failed")
+        self.assertIn("stage 1", runs.get(1002)["error"])
+
+    def test_resume_disabled_fails_run(self):
+        self.write_journal(
+            [
+                {
+                    "event": "run_started",
+                    "run_id": 1003,
+                    "pipeline_id": 7,
+                    "stages": STAGES,
+                }
+            ]
+        )
+        from app.models import runs
+
+        self.start_engine(resume=False)
+        self.assertEqual(runs.get(1003)["status"], "failed")
+
+    def test_shutdown_drains_queued_runs(self):
+        engine = self.start_engine()
+        namespace = get_namespace(DEFAULT_NAMESPACE)
+        queued = [engine.submit(namespace, 7, STAGES) for _ in range(5)]
+        self.assertTrue(engine.shutdown(5))
+        self.assertTrue(all(run["status"] == "succeeded" for run in queued))
+        with self.assertRaises(EngineUnavailable):
+            engine.trigger(namespace, 7, STAGES)
+
+    def test_sigterm_drains_runs_without_blocking(self):
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+        engine = self.start_engine()
+        engine.install_signal_handler(5)
+        namespace = get_namespace(DEFAULT_NAMESPACE)
+        queued = [engine.submit(namespace, 7, STAGES) for _ in range(3)]
+        with patch("os.kill") as kill:
+            signal.raise_signal(signal.SIGTERM)
+            # The handler returned before the runs were drained.
+            self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+            with self.assertRaises(EngineUnavailable):
+                engine.trigger(namespace, 7, STAGES)
+            for _ in range(500):
+                if kill.called:
+                    break
+                time.sleep(0.01)
+        kill.assert_called_once_with(os.getpid(), signal.SIGINT)
+        self.assertTrue(all(run["status"] == "succeeded" for run in queued))
+
+    def test_recovers_run_after_process_crash(self):
+        # The child process dies in the middle of the second RUN stage, before
+        # any BUILD or DEPLOY stage forced a sync.
+        script = textwrap.dedent(f"""
+            import os
+            from unittest.mock import patch
+            from app import engine as engine_module
+            from app.models import DEFAULT_NAMESPACE, get_namespace
+
+            def run_command(stage, env):
+                if stage["command"] == "crash":
+                    os._exit(1)
+                return {{"exit_status": 0, "log": []}}
+
+            engine = engine_module.RunEngine({self.path!r}, 1024 * 1024, 60, 1, True)
+            engine.start()
+            with patch.object(engine_module, "_run_command", run_command):
+                engine.trigger(get_namespace(DEFAULT_NAMESPACE), 7, {STAGES_WITH_CRASH!r})
+            """)
+        env = dict(os.environ, API_KEY=os.environ.get("API_KEY") or "test")
+        process = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env,
+            capture_output=True,
+        )
+        self.assertEqual(process.returncode, 1, process.stderr.decode())
+
+        from app.models import runs
+
+        engine = self.start_engine()
+        self.assertTrue(engine.shutdown(5))
+        with open(self.path) as f:
+            events = [json.loads(line) for line in f]
+        run_id = next(e["run_id"] for e in events if e["event"] == "run_started")
+        self.assertEqual(runs.get(run_id)["resumed_from"], 1)
+        self.assertEqual(runs.get(run_id)["status"], "succeeded")
+        self.assertEqual(
+            [event["index"] for event in events if event["event"] == "stage_started"],
+            [0, 1, 2],
+        )
+
+    def test_run_ids_are_not_reused_after_restart(self):
+        engine = self.start_engine()
+        namespace = get_namespace(DEFAULT_NAMESPACE)
+        last = [engine.trigger(namespace, 7, STAGES)["id"] for _ in range(3)][-1]
+        self.assertTrue(engine.shutdown(5))
+
+        for _ in range(2):
+            engine = self.start_engine()
+            self.assertEqual(engine.trigger(namespace, 7, STAGES)["id"], last + 1)
+            self.assertTrue(engine.shutdown(5))
+            last += 1
+
+    def test_failed_journal_write_releases_run(self):
+        engine = self.start_engine()
+        namespace = get_namespace("journal-failure")
+        namespace.max_concurrent_runs = 1
+        with patch.object(engine.journal, "sync", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                engine.trigger(namespace, 7, STAGES)
+        self.assertEqual(engine.trigger(namespace, 7, STAGES)["status"], "succeeded")
+        self.assertTrue(engine.shutdown(5))
+        self.assertEqual(RunJournal(self.path, 1024, 0).open(), {})
+
+    def test_run_store_evicts_oldest_finished_runs(self):
+        store = RunStore(3)
+        store.add({"id": 1, "status": "running"})
+        for run_id in range(2, 6):
+            store.add({"id": run_id, "status": "succeeded"})
+
+        self.assertIsNotNone(store.get(1))
+        self.assertEqual(
+            [run_id for run_id in range(1, 6) if store.get(run_id)], [1, 4, 5]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
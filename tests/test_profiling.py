@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import support  # noqa: F401
+from app import config, create_app
+from app.config import API_KEY
+from app.profiling import sampler
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.patch_config("PROFILE_DIR", self.tmpdir.name)
+        self.patch_config("ADMIN_API_KEYS", {API_KEY})
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}",
+        }
+
+    def patch_config(self, name, value):
+        patcher = patch.object(config, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_pipeline(self, client):
+        data = {
+            "stages": [
+                {"type": "run", "command": "echo 'Running tests'"},
+                {"type": "deploy", "manifest": "k8s/deployment.yaml"},
+            ]
+        }
+        response = client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        return response.json["id"]
+
+    def read_profiles(self):
+        profiles = []
+        for name in sorted(os.listdir(self.tmpdir.name)):
+            with open(os.path.join(self.tmpdir.name, name)) as f:
+                profiles.append(json.load(f))
+        return profiles
+
+    def test_admin_profile_header(self):
+        client = create_app().test_client()
+        pipeline_id = self.create_pipeline(client)
+
+        response = client.post(
+            f"/pipelines/{pipeline_id}/trigger",
+            headers=dict(self.headers, **{"X-Profile": "1"}),
+        )
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers["X-Profile-Id"]
+
+        profiles = self.read_profiles()
+        self.assertEqual([profile["id"] for profile in profiles], [profile_id])
+        self.assertTrue(profiles[0]["profiled"])
+        self.assertEqual(profiles[0]["endpoint"], "routes.trigger")
+        self.assertEqual(
+            [stage["type"] for stage in profiles[0]["stages"]], ["run", "deploy"]
+        )
+
+    def test_profile_header_requires_admin_key(self):
+        self.patch_config("ADMIN_API_KEYS", {"another_key"})
+        client = create_app().test_client()
+
+        response = client.get(
+            "/pipelines/999", headers=dict(self.headers, **{"X-Profile": "1"})
+        )
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(self.read_profiles(), [])
+
+    def test_slow_request_capture(self):
+        self.patch_config("ADMIN_API_KEYS", set())
+        self.patch_config("SLOW_REQUEST_THRESHOLD_MS", 0.001)
+        client = create_app().test_client()
+        pipeline_id = self.create_pipeline(client)
+
+        with patch.object(sampler, "start") as start:
+            client.post(f"/pipelines/{pipeline_id}/trigger", headers=self.headers)
+        start.assert_not_called()
+        profiles = self.read_profiles()
+        self.assertTrue(all(profile["slow"] for profile in profiles))
+        self.assertIn("routes.trigger", [profile["endpoint"] for profile in profiles])
+        trigger = next(p for p in profiles if p["endpoint"] == "routes.trigger")
+        self.assertEqual(
+            [stage["type"] for stage in trigger["stages"]], ["run", "deploy"]
+        )
+
+    def test_slow_request_sampling(self):
+        self.patch_config("ADMIN_API_KEYS", set())
+        self.patch_config("SLOW_REQUEST_THRESHOLD_MS", 0.001)
+        self.patch_config("SLOW_REQUEST_SAMPLING", True)
+        client = create_app().test_client()
+
+        with patch.object(sampler, "start", wraps=sampler.start) as start:
+            client.get("/pipelines/999", headers=self.headers)
+        start.assert_called_once()
+        self.assertEqual(len(self.read_profiles()), 1)
+
+    def test_profile_directory_is_bounded(self):
+        self.patch_config("PROFILING_ENABLED", True)
+        self.patch_config("PROFILE_MAX_FILES", 2)
+        client = create_app().test_client()
+
+        for _ in range(4):
+            client.get("/pipelines/999", headers=self.headers)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+
+    def test_profile_removed_while_pruning(self):
+        self.patch_config("PROFILING_ENABLED", True)
+        client = create_app().test_client()
+        # A profile another request removed after the directory was listed.
+        os.symlink(
+            os.path.join(self.tmpdir.name, "missing"),
+            os.path.join(self.tmpdir.name, "removed.json"),
+        )
+
+        response = client.get("/pipelines/999", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_hooks_not_registered_when_disabled(self):
+        self.patch_config("ADMIN_API_KEYS", set())
+        app = create_app()
+        self.assertEqual(app.before_request_funcs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock
+import support  # noqa: F401
+from app import create_app
+from app.config import API_KEY
+from app.models import get_namespace
+from app.scheduler import CronExpression, Scheduler, scheduler
+
+STAGES = [{"type": "run", "command": "echo 'Running nightly tests'"}]
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class CronExpressionTestCase(unittest.TestCase):
+    def test_next_after(self):
+        cases = [
+            ("*/15 * * * *", utc(2026, 10, 19, 10, 7), utc(2026, 10, 19, 10, 15)),
+            ("0 2 * * *", utc(2026, 10, 19, 10, 7), utc(2026, 10, 20, 2, 0)),
+            ("@hourly", utc(2026, 10, 19, 10, 0), utc(2026, 10, 19, 11, 0)),
+            ("30 9 * * mon-fri", utc(2026, 10, 23, 10, 0), utc(2026, 10, 26, 9, 30)),
+            ("0 0 1 jan *", utc(2026, 10, 19, 10, 7), utc(2027, 1, 1, 0, 0)),
+            ("0 0 29 2 *", utc(2026, 3, 1, 0, 0), utc(2028, 2, 29, 0, 0)),
+            # Day of month and day of week restricted: either one matches.
+            ("0 0 13 * 5", utc(2026, 10, 19, 0, 0), utc(2026, 10, 23, 0, 0)),
+        ]
+        for expression, moment, expected in cases:
+            with self.subTest(expression=expression):
+                self.assertEqual(
+                    CronExpression(expression).next_after(moment), expected
+                )
+
+    def test_invalid_expressions(self):
+        for expression in [
+            "61 * * * *",
+            "* * *",
+            "*/0 * * * *",
+            "0 0 30 2 *",
+            "a b c d e",
+        ]:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    CronExpression(expression)
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = Mock()
+        self.scheduler = Scheduler(self.engine, catchup=1, misfire_grace=60, jitter=0)
+        self.namespace = get_namespace("scheduler-test")
+        self.pipeline_id = self.namespace.pipelines.add({"stages": STAGES}, 100)
+        self.addCleanup(self.namespace.pipelines.remove, self.pipeline_id)
+
+    def test_run_pending_submits_due_runs(self):
+        self.scheduler.schedule(
+            self.namespace, self.pipeline_id, CronExpression("* * * * *")
+        )
+        due = self.scheduler.next_run(self.namespace, self.pipeline_id)
+
+        self.assertEqual(self.scheduler.run_pending(due - 1), 0)
+        self.assertEqual(self.scheduler.run_pending(due), 1)
+        self.engine.submit.assert_called_once_with(
+            self.namespace, self.pipeline_id, STAGES
+        )
+        self.assertEqual(
+            self.scheduler.next_run(self.namespace, self.pipeline_id), due + 60
+        )
+
+    def test_unschedule(self):
+        self.scheduler.schedule(
+            self.namespace, self.pipeline_id, CronExpression("* * * * *")
+        )
+        due = self.scheduler.next_run(self.namespace, self.pipeline_id)
+        self.scheduler.unschedule(self.namespace, self.pipeline_id)
+
+        self.assertIsNone(self.scheduler.next_run(self.namespace, self.pipeline_id))
+        self.assertEqual(self.scheduler.run_pending(due), 0)
+        self.engine.submit.assert_not_called()
+
+    def test_missed_ticks_catch_up(self):
+        self.scheduler.catchup = 3
+        self.scheduler.schedule(
+            self.namespace, self.pipeline_id, CronExpression("* * * * *")
+        )
+        due = self.scheduler.next_run(self.namespace, self.pipeline_id)
+
+        # Ten ticks were missed, only the configured three are caught up.
+        self.assertEqual(self.scheduler.run_pending(due + 9 * 60 + 1), 3)
+        self.assertEqual(
+            self.scheduler.next_run(self.namespace, self.pipeline_id), due + 10 * 60
+        )
+
+    def test_missed_ticks_skipped(self):
+        self.scheduler.catchup = 0
+        self.scheduler.schedule(
+            self.namespace, self.pipeline_id, CronExpression("* * * * *")
+        )
+        due = self.scheduler.next_run(self.namespace, self.pipeline_id)
+        self.assertEqual(self.scheduler.run_pending(due + 3600), 0)
+
+    def test_jitter_delays_runs(self):
+        self.scheduler.jitter = 30
+        self.scheduler.schedule(
+            self.namespace, self.pipeline_id, CronExpression("0 * * * *")
+        )
+        due = self.scheduler.next_run(self.namespace, self.pipeline_id)
+        tick = CronExpression("0 * * * *").next_after(datetime.now(timezone.utc))
+        self.assertTrue(tick.timestamp() <= due <= tick.timestamp() + 30)
+
+
+class ScheduledPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = create_app().test_client()
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}",
+        }
+
+    def test_create_pipeline_invalid_schedule(self):
+        data = {"stages": STAGES, "schedule": "every night"}
+        response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid schedule", response.json["error"])
+
+    def test_schedule_follows_pipeline(self):
+        namespace = get_namespace("default")
+        data = {"stages": STAGES, "schedule": "0 3 * * *"}
+        response = self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps(data)
+        )
+        self.assertEqual(response.status_code, 201)
+        pipeline_id = response.json["id"]
+        self.assertIsNotNone(scheduler.next_run(namespace, pipeline_id))
+
+        self.client.put(
+            f"/pipelines/{pipeline_id}",
+            headers=self.headers,
+            data=json.dumps({"stages": STAGES}),
+        )
+        self.assertIsNone(scheduler.next_run(namespace, pipeline_id))
+
+        self.client.put(
+            f"/pipelines/{pipeline_id}",
+            headers=self.headers,
+            data=json.dumps(data),
+        )
+        self.client.delete(f"/pipelines/{pipeline_id}", headers=self.headers)
+        self.assertIsNone(scheduler.next_run(namespace, pipeline_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
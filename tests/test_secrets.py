@@ -0,0 +1,254 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import support  # noqa: F401
+from app import create_app
+from app.config import API_KEY
+from app.secret_store import (
+    REDACTED,
+    EncryptedFileSecretProvider,
+    FileSecretProvider,
+    SecretCache,
+    SecretNotFound,
+    redact,
+    secret_cache,
+)
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+class SecretStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "secrets.json")
+        with open(self.path, "w") as f:
+            json.dump(
+                {
+                    "default": {
+                        "DEPLOY_TOKEN": "s3cr3t-token",
+                        "DB_PASSWORD": "hunter2",
+                    },
+                    "team-b": {"DB_PASSWORD": "swordfish"},
+                },
+                f,
+            )
+
+    def test_file_provider(self):
+        provider = FileSecretProvider(self.path)
+        self.assertEqual(
+            provider.get("default", ["DB_PASSWORD", "MISSING"]),
+            {"DB_PASSWORD": "hunter2"},
+        )
+        self.assertEqual(
+            provider.get("team-b", ["DB_PASSWORD"]), {"DB_PASSWORD": "swordfish"}
+        )
+        self.assertEqual(provider.get("team-c", ["DB_PASSWORD"]), {})
+
+    @unittest.skipUnless(Fernet, "cryptography is not installed")
+    def test_encrypted_file_provider(self):
+        key = Fernet.generate_key()
+        with open(self.path, "wb") as f:
+            f.write(
+                Fernet(key).encrypt(
+                    json.dumps({"default": {"DB_PASSWORD": "hunter2"}}).encode()
+                )
+            )
+        provider = EncryptedFileSecretProvider(self.path, key)
+        self.assertEqual(
+            provider.get("default", ["DB_PASSWORD"]), {"DB_PASSWORD": "hunter2"}
+        )
+
+    def test_cache_hits_provider_once_per_ttl(self):
+        provider = FileSecretProvider(self.path)
+        cache = SecretCache(provider, 60)
+        with patch.object(provider, "get", wraps=provider.get) as get:
+            cache.resolve("default", ["DEPLOY_TOKEN", "DB_PASSWORD"])
+            cache.resolve("default", ["DB_PASSWORD", "DEPLOY_TOKEN"])
+        get.assert_called_once()
+
+        cache.ttl = 0
+        cache.clear()
+        with patch.object(provider, "get", wraps=provider.get) as get:
+            cache.resolve("default", ["DB_PASSWORD"])
+            cache.resolve("default", ["DB_PASSWORD"])
+        self.assertEqual(get.call_count, 2)
+
+    def test_cache_skips_provider_for_no_secrets_and_caches_misses(self):
+        provider = FileSecretProvider(self.path)
+        cache = SecretCache(provider, 60)
+        with patch.object(provider, "get", wraps=provider.get) as get:
+            self.assertEqual(cache.resolve("default", []), {})
+            get.assert_not_called()
+            for _ in range(2):
+                with self.assertRaises(SecretNotFound):
+                    cache.resolve("default", ["MISSING"])
+        get.assert_called_once()
+
+    def test_slow_fetch_does_not_block_other_namespaces(self):
+        provider = FileSecretProvider(self.path)
+        cache = SecretCache(provider, 60)
+        fetching = threading.Event()
+        release = threading.Event()
+        get = provider.get
+
+        def slow_get(namespace, names):
+            if namespace == "default":
+                fetching.set()
+                release.wait(5)
+            return get(namespace, names)
+
+        with patch.object(provider, "get", side_effect=slow_get):
+            thread = threading.Thread(
+                target=cache.resolve, args=("default", ["DB_PASSWORD"])
+            )
+            thread.start()
+            self.addCleanup(thread.join)
+            self.addCleanup(release.set)
+            self.assertTrue(fetching.wait(5))
+            self.assertEqual(
+                cache.resolve("team-b", ["DB_PASSWORD"]), {"DB_PASSWORD": "swordfish"}
+            )
+            self.assertTrue(thread.is_alive())
+
+    def test_cache_is_scoped_to_namespace(self):
+        cache = SecretCache(FileSecretProvider(self.path), 60)
+        self.assertEqual(
+            cache.resolve("default", ["DB_PASSWORD"]), {"DB_PASSWORD": "hunter2"}
+        )
+        self.assertEqual(
+            cache.resolve("team-b", ["DB_PASSWORD"]), {"DB_PASSWORD": "swordfish"}
+        )
+        with self.assertRaises(SecretNotFound):
+            cache.resolve("team-b", ["DEPLOY_TOKEN"])
+        self.assertEqual(cache.resolve("team-b", ["DEPLOY_TOKEN"], missing_ok=True), {})
+
+    def test_redact(self):
+        self.assertEqual(
+            redact({"stages": [{"command": "login -p hunter2"}], "id": 1}, ["hunter2"]),
+            {"stages": [{"command": f"login -p {REDACTED}"}], "id": 1},
+        )
+        self.assertEqual(redact("key=abc", ["abc", ""]), f"key={REDACTED}")
+
+
+class SecretInjectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        path = os.path.join(self.tmpdir.name, "secrets.json")
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "default": {"DEPLOY_TOKEN": "s3cr3t-token"},
+                    "team-a": {"TEAM_A_PW": "deploy"},
+                },
+                f,
+            )
+        patcher = patch.object(secret_cache, "provider", FileSecretProvider(path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(secret_cache.clear)
+
+        self.client = create_app().test_client()
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}",
+        }
+
+    def create(self, stages):
+        return self.client.post(
+            "/pipelines", headers=self.headers, data=json.dumps({"stages": stages})
+        )
+
+    def test_invalid_secrets_and_env(self):
+        response = self.create([{"type": "run", "command": "x", "secrets": "TOKEN"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'secrets' must be a list", response.json["error"])
+
+        response = self.create([{"type": "run", "command": "x", "env": {"A": 1}}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'env' must map variable names", response.json["error"])
+
+    def test_secrets_are_redacted(self):
+        pipeline_id = self.create(
+            [
+                {
+                    "type": "run",
+                    "command": "deploy --token s3cr3t-token",
+                    "secrets": ["DEPLOY_TOKEN"],
+                    "env": {"STAGE": "production"},
+                }
+            ]
+        ).json["id"]
+
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            response = self.client.post(
+                f"/pipelines/{pipeline_id}/trigger", headers=self.headers
+            )
+        self.assertEqual(response.json["status"], "succeeded")
+        self.assertNotIn("s3cr3t-token", stdout.getvalue())
+        self.assertIn(REDACTED, stdout.getvalue())
+
+        response = self.client.get(f"/pipelines/{pipeline_id}", headers=self.headers)
+        self.assertNotIn("s3cr3t-token", response.get_data(as_text=True))
+        self.assertEqual(response.json["stages"][0]["secrets"], ["DEPLOY_TOKEN"])
+
+    def test_secrets_of_other_namespaces_are_not_resolved(self):
+        pipeline_id = self.client.post(
+            "/namespaces/team-b/pipelines",
+            headers=self.headers,
+            data=json.dumps(
+                {"stages": [{"type": "run", "command": "x", "secrets": ["TEAM_A_PW"]}]}
+            ),
+        ).json["id"]
+        response = self.client.post(
+            f"/namespaces/team-b/pipelines/{pipeline_id}/trigger", headers=self.headers
+        )
+        self.assertEqual(response.json["status"], "failed")
+        self.assertIn("Secret not found: TEAM_A_PW", response.json["error"])
+
+    def test_only_referenced_secrets_are_redacted(self):
+        team_a = self.client.post(
+            "/namespaces/team-a/pipelines",
+            headers=self.headers,
+            data=json.dumps(
+                {"stages": [{"type": "run", "command": "x", "secrets": ["TEAM_A_PW"]}]}
+            ),
+        ).json["id"]
+        with patch("sys.stdout", new_callable=io.StringIO):
+            self.client.post(
+                f"/namespaces/team-a/pipelines/{team_a}/trigger", headers=self.headers
+            )
+
+        deploy = [{"type": "deploy", "manifest": "k8s/deployment.yaml"}]
+        pipeline_id = self.create(deploy).json["id"]
+        response = self.client.get(f"/pipelines/{pipeline_id}", headers=self.headers)
+        self.assertEqual(response.json["stages"], deploy)
+
+        response = self.client.get(
+            f"/namespaces/team-a/pipelines/{team_a}", headers=self.headers
+        )
+        self.assertEqual(response.json["stages"][0]["type"], "run")
+
+    def test_missing_secret_fails_run(self):
+        pipeline_id = self.create(
+            [{"type": "run", "command": "deploy", "secrets": ["MISSING"]}]
+        ).json["id"]
+        response = self.client.post(
+            f"/pipelines/{pipeline_id}/trigger", headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["status"], "failed")
+        self.assertIn("Secret not found: MISSING", response.json["error"])
+        self.assertEqual(response.json["stages"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()